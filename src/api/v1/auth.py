@@ -3,6 +3,7 @@ from http import HTTPStatus
 from fastapi import APIRouter, Depends, HTTPException, Header, Request
 from starlette.responses import Response
 
+from db.unit_of_work import UnitOfWorkRoute
 from limiter import rate_limit
 from services.auth import (get_sign_up_service, SignUpService, LoginService, get_login_service, LogoutService,
                            get_logout_service)
@@ -10,7 +11,7 @@ from models.users import UserLogin, UserCreate, UserMessageOut
 from services.refresh import RefreshService, get_refresh_service
 
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.post('/signup/',
@@ -47,7 +48,7 @@ async def login(request: Request,
 async def logout(request: Request,
                  full_logout: bool = False,
                  user_logout: LogoutService = Depends(get_logout_service)) -> UserMessageOut:
-    await user_logout.delete(request)
+    await user_logout.delete(request, full_logout)
     return UserMessageOut(message="Logout success")
 
 
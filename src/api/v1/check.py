@@ -0,0 +1,31 @@
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, Query
+from starlette.requests import Request
+from starlette.responses import Response
+
+from models.users import UserError
+from services.check import PermissionCheckService, get_permission_check_service
+
+router = APIRouter()
+
+
+@router.get('/check/',
+            description='Проверка прав для auth_request шлюза: пустой ответ и заголовки X-User-*',
+            status_code=HTTPStatus.NO_CONTENT,
+            response_class=Response,
+            responses={HTTPStatus.BAD_REQUEST: {'model': UserError},
+                       HTTPStatus.UNAUTHORIZED: {'model': UserError},
+                       HTTPStatus.FORBIDDEN: {'model': UserError}})
+async def check_permissions(request: Request,
+                            permissions: Annotated[str | None, Query(description='Comma separated permissions, '
+                                                                                 'any of them is enough: '
+                                                                                 'subscriber,manager')] = None,
+                            required_permissions: Annotated[str | None, Header(
+                                alias='X-Required-Permissions',
+                                description='Same as permissions, set by nginx for auth_request')] = None,
+                            check: PermissionCheckService = Depends(get_permission_check_service)) -> Response:
+    required = check.parse_required(permissions) | check.parse_required(required_permissions)
+    headers = await check.get_data(request, required)
+    return Response(status_code=HTTPStatus.NO_CONTENT, headers=headers)
@@ -0,0 +1,20 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter
+from starlette.responses import PlainTextResponse
+
+from core import metrics
+from core.config import settings
+
+router = APIRouter()
+
+
+@router.get('/metrics',
+            description="Метрики всех воркеров в формате Prometheus",
+            status_code=HTTPStatus.OK,
+            response_class=PlainTextResponse,
+            include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    # Файл, не обновлявшийся три интервала, остался от завершившегося воркера
+    body = metrics.render(settings.metrics.directory, stale_after=3 * settings.metrics.export_interval)
+    return PlainTextResponse(body, media_type='text/plain; version=0.0.4')
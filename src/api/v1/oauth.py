@@ -3,11 +3,12 @@ from http import HTTPStatus
 from fastapi import APIRouter, Depends, Header, HTTPException
 from starlette.responses import Response
 
+from db.unit_of_work import UnitOfWorkRoute
 from services.oauth import (YandexAuthServiceCallback, YandexAuthServiceLogin,
                             get_yandex_callback_service,
                             get_yandex_login_service)
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 YANDEX = 'yandex'
 
@@ -2,8 +2,9 @@ from typing import Annotated
 from http import HTTPStatus
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 
+from db.unit_of_work import UnitOfWorkRoute
 from limiter import rate_limit
 from models.users import ChangeUserProfile, UserProfileResult, UserProfileHistory, UserChangePassword, UserError, \
     Paginator
@@ -11,7 +12,7 @@ from services.profile import ProfileInfoService, get_profile_info_service, Profi
     get_profile_history_service, ProfileUpdateInfoService, patch_profile_info_service, UpdatePasswordService, \
     update_password_service
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get('/profile/',
@@ -22,13 +23,10 @@ router = APIRouter()
                        HTTPStatus.SERVICE_UNAVAILABLE: {'model': UserError}})
 @rate_limit()
 async def user_profile(request: Request,
-                       user_info: ProfileInfoService = Depends(get_profile_info_service)) -> UserProfileResult:
+                       user_info: ProfileInfoService = Depends(get_profile_info_service)) -> Response:
+    # Сервис отдаёт уже сериализованный профиль, повторная валидация не нужна
     answer = await user_info.get_data()
-    if answer:
-        return answer
-    else:
-        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST,
-                            detail='Error while retrieving user information')
+    return Response(content=answer, media_type='application/json')
 
 
 @router.patch('/profile/',
@@ -65,12 +63,28 @@ async def profile_history(request: Request,
                           limit: Annotated[int, Query(ge=1,
                                            le=100,
                                            description='Pagination page number')] = 10,
+                          cursor: Annotated[str | None, Query(description='next_cursor from the previous page; '
+                                                                          'page is ignored when set')] = None,
                           history: ProfileHistoryService = Depends(get_profile_history_service)
                           ) -> Paginator[UserProfileHistory]:
-    answer = await history.get_data(page, limit)
+    answer = await history.get_data(page, limit, cursor)
     return answer
 
 
+@router.get('/profile/history/export',
+            description='Выгрузка всей истории входов в формате NDJSON',
+            response_class=StreamingResponse,
+            responses={HTTPStatus.UNAUTHORIZED: {'model': UserError},
+                       HTTPStatus.SERVICE_UNAVAILABLE: {'model': UserError}})
+@rate_limit()
+async def profile_history_export(request: Request,
+                                 history: ProfileHistoryService = Depends(get_profile_history_service)
+                                 ) -> StreamingResponse:
+    return StreamingResponse(await history.export(),
+                             media_type='application/x-ndjson',
+                             headers={'Content-Disposition': 'attachment; filename="login_history.ndjson"'})
+
+
 @router.patch('/profile/change_password/',
               description='Изменение пароля пользователя',
               status_code=HTTPStatus.CREATED,
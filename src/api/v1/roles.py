@@ -3,13 +3,14 @@ from http import HTTPStatus
 from fastapi import APIRouter, Depends, HTTPException
 from starlette.requests import Request
 
+from db.unit_of_work import UnitOfWorkRoute
 from models.roles import CreateRole, RoleDelete, RoleChangePermission, RoleError, RoleToRepresentation
 from models.users import UserMessageOut
 from services.roles import (RoleGetService, RoleCreateService,
                             RoleDeleteService, RoleUpdateService, get_role_get_service,
                             get_role_create_service, get_role_delete_service, get_role_update_service)
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get('/roles/',
@@ -0,0 +1,25 @@
+from http import HTTPStatus
+from uuid import UUID
+
+from fastapi import APIRouter, Depends
+from starlette.requests import Request
+
+from db.unit_of_work import UnitOfWorkRoute
+from models.users import UserError, UserMessageOut
+from services.sessions import RevokeSessionsService, get_revoke_sessions_service
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+
+@router.delete("/users/{user_id}/sessions/",
+               description="Принудительный выход пользователя со всех устройств",
+               status_code=HTTPStatus.OK,
+               response_model=UserMessageOut,
+               responses={HTTPStatus.UNAUTHORIZED: {'model': UserError},
+                          HTTPStatus.FORBIDDEN: {'model': UserError},
+                          HTTPStatus.NOT_FOUND: {'model': UserError}})
+async def revoke_sessions(user_id: UUID,
+                          request: Request,
+                          sessions: RevokeSessionsService = Depends(get_revoke_sessions_service)) -> UserMessageOut:
+    await sessions.delete(request, user_id)
+    return UserMessageOut(message="Sessions revoked")
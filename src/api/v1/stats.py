@@ -0,0 +1,51 @@
+from http import HTTPStatus
+from typing import Annotated
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, Query
+from starlette.requests import Request
+
+from db.unit_of_work import UnitOfWorkRoute
+from limiter import rate_limit
+from models.users import LoginStatsDay, UserError, UserLoginStats
+from services.stats import LoginStatsService, get_login_stats_service
+
+router = APIRouter(route_class=UnitOfWorkRoute)
+
+Days = Annotated[int, Query(ge=1, le=365, description='Number of days to report, including today')]
+
+
+@router.get('/profile/stats',
+            description='Статистика входов пользователя по дням и типам устройств',
+            response_model=UserLoginStats,
+            responses={HTTPStatus.UNAUTHORIZED: {'model': UserError},
+                       HTTPStatus.SERVICE_UNAVAILABLE: {'model': UserError}})
+@rate_limit()
+async def profile_stats(request: Request,
+                        days: Days = 30,
+                        stats: LoginStatsService = Depends(get_login_stats_service)) -> UserLoginStats:
+    return await stats.get_data(days)
+
+
+@router.get('/users/{user_id}/stats',
+            description='Статистика входов пользователя для поддержки',
+            response_model=UserLoginStats,
+            responses={HTTPStatus.UNAUTHORIZED: {'model': UserError},
+                       HTTPStatus.FORBIDDEN: {'model': UserError},
+                       HTTPStatus.NOT_FOUND: {'model': UserError}})
+async def user_stats(user_id: UUID,
+                     request: Request,
+                     days: Days = 30,
+                     stats: LoginStatsService = Depends(get_login_stats_service)) -> UserLoginStats:
+    return await stats.get_user_data(user_id, days)
+
+
+@router.get('/stats/logins',
+            description='Число входов по дням и типам устройств для дашбордов',
+            response_model=list[LoginStatsDay],
+            responses={HTTPStatus.UNAUTHORIZED: {'model': UserError},
+                       HTTPStatus.FORBIDDEN: {'model': UserError}})
+async def login_totals(request: Request,
+                       days: Days = 30,
+                       stats: LoginStatsService = Depends(get_login_stats_service)) -> list[LoginStatsDay]:
+    return await stats.get_totals(days)
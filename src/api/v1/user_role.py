@@ -3,12 +3,13 @@ from fastapi import APIRouter, Depends
 from http import HTTPStatus
 from starlette.requests import Request
 
-from models.roles import RoleAssign, UserRole, RoleInDB
+from db.unit_of_work import UnitOfWorkRoute
+from models.roles import RoleAssign, UserRole, RoleInDB, UserRolesRequest, UserRolesMap
 from models.users import UserError
 from services.user_role import (UpdateUserRoleService, GetUserRoleService,
                                 update_user_role_service, get_user_role_service)
 
-router = APIRouter()
+router = APIRouter(route_class=UnitOfWorkRoute)
 
 
 @router.get("/user_role/{user_id}/",
@@ -25,6 +26,20 @@ async def get_user_role(user_id: str,
     return answer
 
 
+@router.post("/user_role/bulk/",
+             description="Роли нескольких пользователей одним запросом",
+             status_code=HTTPStatus.OK,
+             response_model=UserRolesMap,
+             responses={HTTPStatus.BAD_REQUEST: {'model': UserError},
+                        HTTPStatus.UNAUTHORIZED: {'model': UserError},
+                        HTTPStatus.SERVICE_UNAVAILABLE: {'model': UserError}})
+async def get_user_roles(users: UserRolesRequest,
+                         request: Request,
+                         get_role: GetUserRoleService = Depends(get_user_role_service)) -> UserRolesMap:
+    answer = await get_role.get_many(request, users.user_ids)
+    return answer
+
+
 @router.post("/user_role/",
              description="Назначение роли",
              status_code=HTTPStatus.CREATED,
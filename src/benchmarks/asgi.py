@@ -0,0 +1,44 @@
+"""Вызов ASGI-приложения в процессе, без сети и HTTP-сервера."""
+import asyncio
+
+
+def make_scope(path: str, headers: list[tuple[bytes, bytes]] = (), query: bytes = b'',
+               method: str = 'GET') -> dict:
+    return {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': query,
+        'headers': list(headers),
+        'client': ('127.0.0.1', 1),
+        'server': ('127.0.0.1', 8000),
+    }
+
+
+async def call(app, scope: dict) -> int:
+    """Выполняет запрос и возвращает статус ответа."""
+    status = 0
+    messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+    disconnect = asyncio.Event()
+
+    async def receive():
+        # После тела запроса клиент молчит, пока ответ не отправлен
+        message = next(messages, None)
+        if message is None:
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+        return message
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(dict(scope), receive, send)
+    disconnect.set()
+    return status
@@ -0,0 +1,63 @@
+"""Микробенчмарк проверки токена на запрос /profile/: старые вызовы AuthJWT против AuthContext.
+
+Запуск из директории src:
+
+    python -m benchmarks.auth_context --iterations 20000
+"""
+import argparse
+import asyncio
+import time
+
+from async_fastapi_jwt_auth import AuthJWT
+from starlette.requests import Request
+
+from core.config import JWTSettings
+from services.common.auth_context import ACCESS_COOKIE, get_auth_context
+
+
+def make_request(token: str) -> Request:
+    return Request({
+        'type': 'http',
+        'method': 'GET',
+        'path': '/api/v1/profile/',
+        'headers': [(b'cookie', f'{ACCESS_COOKIE}={token}'.encode())],
+    })
+
+
+async def legacy_profile_checks(request: Request) -> None:
+    """Повторяет то, что раньше делал запрос /profile/: check_access и ProfileInfoService.get_data."""
+    authorize = AuthJWT(req=request)
+    await authorize.jwt_required()
+    await authorize.get_raw_jwt()
+    await authorize.jwt_required()
+    await authorize.get_jwt_subject()
+
+
+async def context_profile_checks(request: Request) -> None:
+    auth = await get_auth_context(request, AuthJWT(req=request))
+    auth.jti, auth.subject
+
+
+async def measure(name: str, iterations: int, check, request: Request) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        await check(request)
+    per_request = (time.perf_counter() - started) / iterations * 1_000_000
+    print(f'{name:>8}: {per_request:.1f} us/request')
+    return per_request
+
+
+async def main(iterations: int) -> None:
+    AuthJWT.load_config(JWTSettings)
+    token = await AuthJWT().create_access_token(subject='bench', user_claims={'role_id': 1})
+    request = make_request(token)
+
+    legacy = await measure('legacy', iterations, legacy_profile_checks, request)
+    current = await measure('context', iterations, context_profile_checks, request)
+    print(f'saved: {legacy - current:.1f} us/request ({legacy / current:.1f}x)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    asyncio.run(main(parser.parse_args().iterations))
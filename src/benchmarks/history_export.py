@@ -0,0 +1,82 @@
+"""Память и время выгрузки истории входов: список pydantic-объектов против потокового NDJSON.
+
+Создаёт пользователя с --rows записями истории, выгружает её старым способом
+(все строки в список UserProfileHistory) и через ProfileHistoryService.export_rows,
+замеряя пик памяти tracemalloc.
+
+Запуск из директории src (нужна накаченная миграциями база из .env):
+
+    python -m benchmarks.history_export --rows 1000000
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+import uuid
+
+import orjson
+from sqlalchemy import select, text
+
+from db.postgres import async_session, engine
+from models.schemas import LoginHistory
+from models.users import UserProfileHistory
+from services.profile import ProfileHistoryService
+
+LOGIN = 'benchexport'
+
+
+async def legacy_export(session, user_id) -> int:
+    """Старый путь: все строки материализуются в список, затем сериализуются целиком."""
+    history = (await session.execute(select(LoginHistory).where(LoginHistory.user_id == user_id))).scalars()
+    results = [UserProfileHistory(**row.__dict__) for row in history]
+    return len(orjson.dumps([result.model_dump() for result in results]))
+
+
+async def streaming_export(session, user_id) -> int:
+    size = 0
+    async for chunk in ProfileHistoryService(session, None, None, None).export_rows(user_id):
+        size += len(chunk)
+    return size
+
+
+async def measure(name: str, export, user_id) -> None:
+    async with async_session() as session:
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = await export(session, user_id)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f'{name:>9}: {elapsed:.1f} s, peak memory {peak / 2 ** 20:.1f} MiB, {size / 2 ** 20:.1f} MiB written')
+
+
+async def main(rows: int) -> None:
+    user_id = uuid.uuid4()
+    async with async_session() as session:
+        await session.execute(
+            text('INSERT INTO users (id, username, login, password, email) '
+                 'VALUES (:id, :login, :login, :login, :email)'),
+            {'id': user_id, 'login': LOGIN, 'email': f'{LOGIN}@example.com'},
+        )
+        await session.execute(
+            text("INSERT INTO login_histories (user_agent, user_device_type, auth_date, created_at, user_id) "
+                 "SELECT 'Mozilla/5.0 (Windows NT 10.0) bench', 'desktop', "
+                 "now() - i * interval '1 minute', now(), :user_id FROM generate_series(1, :rows) i"),
+            {'user_id': user_id, 'rows': rows},
+        )
+        await session.commit()
+    try:
+        await measure('legacy', legacy_export, user_id)
+        await measure('streaming', streaming_export, user_id)
+    finally:
+        async with async_session() as session:
+            await session.execute(text('DELETE FROM login_histories WHERE user_id = :user_id'), {'user_id': user_id})
+            await session.execute(text('DELETE FROM users WHERE id = :user_id'), {'user_id': user_id})
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    asyncio.run(main(parser.parse_args().rows))
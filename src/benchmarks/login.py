@@ -0,0 +1,127 @@
+"""Сравнение старого и нового пути логина по числу обращений к Postgres и задержке.
+
+Запуск из директории src (нужна накаченная миграциями база из .env):
+
+    python -m benchmarks.login --iterations 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from async_fastapi_jwt_auth import AuthJWT
+from sqlalchemy import event, select, text
+from starlette.responses import Response
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from core.config import JWTSettings, settings
+from db.login_history import LoginHistoryWriter
+from db.postgres import async_session, engine
+from db.unit_of_work import commit
+from models.schemas import LoginHistory, Token, User
+from models.users import UserLogin
+from services.auth import LoginService
+from utils.hashing import PasswordHasher, token_digest
+
+LOGIN = 'benchlogin'
+PASSWORD = 'Bench-password1!'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0) bench'
+# Каждое из этих событий — отдельный сетевой round trip до Postgres
+EVENTS = ('begin', 'before_cursor_execute', 'commit')
+
+
+class RoundTripCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+async def legacy_login(session, user: UserLogin, authorize: AuthJWT):
+    """Путь логина до оптимизации: два SELECT и два COMMIT."""
+    result = await session.execute(select(User).where(User.login == user.login))
+    user_found = result.scalars().first()
+    result = await session.execute(select(User.password).where(User.login == user.login))
+    check_password_hash(result.scalars().first(), user.password)
+
+    refresh_token = await authorize.create_refresh_token(subject=str(user_found.id))
+    await authorize.create_access_token(subject=str(user_found.id), user_claims={'role_id': user_found.role_id})
+
+    session.add(LoginHistory(user_id=user_found.id, user_agent=USER_AGENT))
+    await session.commit()
+    session.add(Token(user_id=user_found.id, user_agent=USER_AGENT,
+                      refresh_token_hash=token_digest(refresh_token)))
+    await session.commit()
+
+
+async def current_login(session, user: UserLogin, authorize: AuthJWT, hasher: PasswordHasher,
+                        history_writer: LoginHistoryWriter):
+    await LoginService(session, authorize, hasher, history_writer).get_data(user, USER_AGENT)
+    # В приложении коммитит UnitOfWorkRoute после обработчика
+    await commit(session)
+
+
+async def run(name: str, iterations: int, login_once) -> None:
+    counter = RoundTripCounter()
+    for event_name in EVENTS:
+        event.listen(engine.sync_engine, event_name, counter)
+    timings = []
+    try:
+        for _ in range(iterations):
+            async with async_session() as session:
+                started = time.perf_counter()
+                await login_once(session)
+                timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        for event_name in EVENTS:
+            event.remove(engine.sync_engine, event_name, counter)
+
+    p99 = statistics.quantiles(timings, n=100)[98]
+    print(f'{name:>8}: round trips/login={counter.count / iterations:.1f} '
+          f'p50={statistics.median(timings):.2f}ms p99={p99:.2f}ms')
+
+
+async def main(iterations: int) -> None:
+    AuthJWT.load_config(JWTSettings)
+    # Дешёвый хэш, чтобы в замер попадала работа с базой, а не scrypt
+    password_hash = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1')
+    async with async_session() as session:
+        await session.execute(
+            text('INSERT INTO users (id, username, login, password, email) '
+                 'VALUES (:id, :login, :login, :password, :email)'),
+            {'id': uuid.uuid4(), 'login': LOGIN, 'password': password_hash, 'email': f'{LOGIN}@example.com'}
+        )
+        await session.commit()
+
+    hasher = PasswordHasher(workers=1, queue_size=1)
+    history_writer = LoginHistoryWriter(batch_size=settings.login_history.batch_size,
+                                        flush_interval=settings.login_history.flush_interval,
+                                        max_pending=iterations,
+                                        put_timeout=settings.login_history.put_timeout)
+    await history_writer.start()
+    user = UserLogin(login=LOGIN, password=PASSWORD)
+    try:
+        await run('legacy', iterations,
+                  lambda session: legacy_login(session, user, AuthJWT(res=Response())))
+        await run('current', iterations,
+                  lambda session: current_login(session, user, AuthJWT(res=Response()), hasher, history_writer))
+    finally:
+        await history_writer.close()
+        hasher.close()
+        async with async_session() as session:
+            for table in ('login_histories', 'tokens'):
+                await session.execute(
+                    text(f'DELETE FROM {table} WHERE user_id IN (SELECT id FROM users WHERE login = :login)'),
+                    {'login': LOGIN}
+                )
+            await session.execute(text('DELETE FROM users WHERE login = :login'), {'login': LOGIN})
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=500)
+    asyncio.run(main(parser.parse_args().iterations))
@@ -0,0 +1,93 @@
+"""Пропускная способность стека middleware: два @app.middleware('http') против RequestIdMiddleware.
+
+Оба стека оборачивают один и тот же пустой обработчик. Замеряются запросы в секунду
+с X-Request-Id и без него, а также сколько раз обработчик выполнился для
+отклонённых запросов (в старом стеке он отрабатывал полностью до ответа 400).
+
+Запуск из директории src:
+
+    python -m benchmarks.middleware --requests 20000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI, Request, status
+from fastapi.responses import ORJSONResponse
+from opentelemetry import trace
+
+from benchmarks.asgi import call, make_scope
+from core.request_id import RequestIdMiddleware
+
+handler_calls = 0
+
+
+def build_app() -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+
+    @app.get('/ping')
+    async def ping() -> dict:
+        global handler_calls
+        handler_calls += 1
+        return {'ok': True}
+
+    return app
+
+
+def legacy_app() -> FastAPI:
+    """Middleware в том виде, в каком они были в main.py."""
+    app = build_app()
+
+    @app.middleware('http')
+    async def add_request_id_tag(request: Request, call_next):
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("request_id_middleware") as span:
+            span.set_attribute('http.request_id', request.headers.get('X-Request-Id'))
+            response = await call_next(request)
+        return response
+
+    @app.middleware('http')
+    async def before_request(request: Request, call_next):
+        response = await call_next(request)
+        request_id = request.headers.get('X-Request-Id')
+        if not request_id:
+            return ORJSONResponse(status_code=status.HTTP_400_BAD_REQUEST,
+                                  content={'detail': 'X-Request-Id is required'})
+        return response
+
+    return app
+
+
+def asgi_app(tracing: bool) -> FastAPI:
+    app = build_app()
+    app.add_middleware(RequestIdMiddleware, tracing=tracing)
+    return app
+
+
+async def measure(name: str, app: FastAPI, requests: int, concurrency: int) -> None:
+    global handler_calls
+    valid = make_scope('/ping', [(b'x-request-id', b'bench')])
+    missing = make_scope('/ping')
+
+    for label, scope in (('valid', valid), ('no id', missing)):
+        handler_calls = 0
+        started = time.perf_counter()
+        for _ in range(requests // concurrency):
+            statuses = await asyncio.gather(*(call(app, scope) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        print(f'{name:>14} {label:>6}: {requests / elapsed:8.0f} req/s, status {statuses[0]}, '
+              f'handler ran {handler_calls} times')
+
+
+async def main(requests: int, concurrency: int) -> None:
+    await measure('legacy', legacy_app(), requests, concurrency)
+    await measure('asgi', asgi_app(tracing=False), requests, concurrency)
+    await measure('asgi + tracing', asgi_app(tracing=True), requests, concurrency)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,66 @@
+"""Задержка GET /api/v1/check/ на полном ASGI-стеке приложения, цель — меньше миллисекунды.
+
+Запросы идут напрямую в main.app без сети: замеряются middleware, разбор токена,
+фильтр отзыва и проверка прав. Заодно считается число SQL-запросов, оно должно быть 0.
+
+Запуск из директории src (нужны Redis и Postgres из .env для lifespan):
+
+    python -m benchmarks.permission_check --requests 20000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from async_fastapi_jwt_auth import AuthJWT
+from sqlalchemy import event
+
+from benchmarks.asgi import call, make_scope
+from db.postgres import engine
+from main import app
+from services.common.auth_context import ACCESS_COOKIE
+from services.common.permissions import Permission
+
+
+def check_scope(headers: list[tuple[bytes, bytes]], query: bytes = b'') -> dict:
+    return make_scope('/api/v1/check/', [(b'x-request-id', b'bench'), *headers], query)
+
+
+async def measure(name: str, requests: int, scope: dict) -> None:
+    latencies = []
+    status = None
+    for _ in range(requests):
+        started = time.perf_counter()
+        status = await call(app, scope)
+        latencies.append((time.perf_counter() - started) * 1_000_000)
+    latencies.sort()
+    p50, p99 = statistics.median(latencies), latencies[int(len(latencies) * 0.99)]
+    verdict = 'ok' if p99 < 1000 else 'over 1 ms'
+    print(f'{name:>10}: status {status}, p50 {p50:.0f} us, p99 {p99:.0f} us ({verdict})')
+
+
+async def main(requests: int) -> None:
+    queries = 0
+
+    def count_query(*args):
+        nonlocal queries
+        queries += 1
+
+    async with app.router.lifespan_context(app):
+        token = await AuthJWT().create_access_token(
+            subject='00000000-0000-0000-0000-000000000000',
+            user_claims={'role_id': None, 'perms': int(Permission.SUBSCRIBER), 'role_ver': 0},
+        )
+        event.listen(engine.sync_engine, 'before_cursor_execute', count_query)
+        await measure('anonymous', requests, check_scope([]))
+        await measure('bearer', requests, check_scope([(b'authorization', f'Bearer {token}'.encode())]))
+        await measure('cookie', requests, check_scope([(b'cookie', f'{ACCESS_COOKIE}={token}'.encode())],
+                                                     b'permissions=subscriber'))
+        event.remove(engine.sync_engine, 'before_cursor_execute', count_query)
+    print(f'SQL queries during checks: {queries}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    asyncio.run(main(parser.parse_args().requests))
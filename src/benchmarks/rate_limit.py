@@ -0,0 +1,113 @@
+"""Нагрузочный тест лимитера: задержка event loop и число обращений к Redis.
+
+Пока запросы проходят через лимитер, фоновая задача каждую миллисекунду
+засыпает и замеряет, насколько позже она просыпается. Синхронный клиент
+держит loop на каждом GET/SETEX, асинхронный — нет. Для асинхронного лимитера
+сравниваются аренда по одному токену и по --chunk токенов.
+
+Запуск из директории src (нужен Redis из .env):
+
+    python -m benchmarks.rate_limit --requests 20000 --concurrency 100 --chunk 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from redis import Redis as SyncRedis
+from redis.asyncio import Redis
+from starlette.requests import Request
+
+from core.config import settings
+from db import redis
+import limiter
+from limiter import RateLimiter, rate_limit
+
+LIMIT = 10 ** 9
+INTERVAL = 60
+TICK = 0.001
+
+
+def make_request(host: str) -> Request:
+    return Request({'type': 'http', 'method': 'POST', 'path': '/api/v1/login/', 'headers': [],
+                    'client': (host, 0)})
+
+
+def legacy_rate_limit(client: SyncRedis):
+    """Лимитер до оптимизации: синхронные GET и SETEX."""
+    def decorator(func):
+        async def wrapper(request: Request):
+            key = f"rate_limit:{request.client.host}"
+            current_count = client.get(key)
+            if current_count is None:
+                client.setex(key, INTERVAL, 1)
+            else:
+                client.setex(key, INTERVAL, int(current_count) + 1)
+            return await func(request)
+        return wrapper
+    return decorator
+
+
+async def handler(request: Request):
+    return None
+
+
+async def measure_lag(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append((time.perf_counter() - started - TICK) * 1000)
+
+
+def redis_calls(client: SyncRedis) -> int:
+    return sum(stats['calls'] for name, stats in client.info('commandstats').items()
+               if name in ('cmdstat_evalsha', 'cmdstat_eval', 'cmdstat_get', 'cmdstat_setex'))
+
+
+async def run(name: str, endpoint, requests: int, concurrency: int, sync_client: SyncRedis) -> None:
+    calls = redis_calls(sync_client)
+    queue = iter(range(requests))
+
+    async def client(number: int):
+        request = make_request(f'10.0.{number // 256}.{number % 256}')
+        for _ in queue:
+            await endpoint(request)
+
+    stop, lags = asyncio.Event(), []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    calls = redis_calls(sync_client) - calls
+
+    lags.sort()
+    print(f'{name:>8}: {requests / elapsed:8.0f} req/s, loop lag p50 {statistics.median(lags):.2f} ms, '
+          f'p99 {lags[int(len(lags) * 0.99)]:.2f} ms, max {lags[-1]:.2f} ms, '
+          f'redis calls {calls} ({calls / requests:.2f}/request)')
+
+
+async def main(requests: int, concurrency: int, chunk: int) -> None:
+    redis.redis = Redis(host=settings.redis.host, port=settings.redis.port)
+    sync_client = SyncRedis(host=settings.redis.host, port=settings.redis.port)
+    try:
+        await run('sync', legacy_rate_limit(sync_client)(handler), requests, concurrency, sync_client)
+        limiter.rate_limiter = RateLimiter(chunk=1, lease_ttl=1.0)
+        await run('async', rate_limit(LIMIT, INTERVAL)(handler), requests, concurrency, sync_client)
+        limiter.rate_limiter = RateLimiter(chunk=chunk, lease_ttl=1.0)
+        await run(f'chunk={chunk}', rate_limit(LIMIT, INTERVAL)(handler), requests, concurrency, sync_client)
+    finally:
+        for key in sync_client.scan_iter('rate_limit:10.0.*'):
+            sync_client.delete(key)
+        sync_client.close()
+        await redis.redis.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--chunk', type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.chunk))
@@ -0,0 +1,84 @@
+"""Размер индекса и скорость поиска/ротации refresh-токенов: полный JWT против sha256.
+
+Во временных таблицах создаётся --rows строк с токенами длины настоящего JWT
+и с их sha256, после чего сравниваются размеры уникальных индексов и время
+поиска и замены токена по каждому из них.
+
+Запуск из директории src (нужна база из .env):
+
+    python -m benchmarks.refresh_tokens --rows 2000000 --iterations 2000
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+
+from sqlalchemy import text
+
+from db.postgres import engine
+from utils.hashing import token_digest
+
+# Длина refresh-токена, который выдаёт сервис
+TOKEN_LENGTH = 320
+
+
+def fake_token(number: int) -> str:
+    return (hashlib.md5(str(number).encode()).hexdigest() * 10)[:TOKEN_LENGTH]
+
+
+TOKEN_SQL = f"left(repeat(md5(i::text), 10), {TOKEN_LENGTH})"
+
+
+async def measure(connection, statement: str, params) -> float:
+    started = time.perf_counter()
+    for values in params:
+        await connection.execute(text(statement), values)
+    return (time.perf_counter() - started) / len(params) * 1_000_000
+
+
+async def main(rows: int, iterations: int) -> None:
+    async with engine.connect() as connection:
+        await connection.execute(text('CREATE TEMP TABLE bench_text (id serial, refresh_token varchar(500) UNIQUE)'))
+        await connection.execute(text('CREATE TEMP TABLE bench_digest (id serial, refresh_token_hash bytea UNIQUE)'))
+        await connection.execute(text(f'INSERT INTO bench_text (refresh_token) '
+                                      f'SELECT {TOKEN_SQL} FROM generate_series(1, :rows) i'), {'rows': rows})
+        await connection.execute(text(f"INSERT INTO bench_digest (refresh_token_hash) "
+                                      f"SELECT sha256(convert_to({TOKEN_SQL}, 'UTF8')) "
+                                      f"FROM generate_series(1, :rows) i"), {'rows': rows})
+        await connection.execute(text('ANALYZE bench_text'))
+        await connection.execute(text('ANALYZE bench_digest'))
+
+        for table in ('bench_text', 'bench_digest'):
+            size = (await connection.execute(text(f"SELECT pg_size_pretty(pg_indexes_size('{table}'))"))).scalar()
+            print(f'{table:>12} index: {size}')
+
+        numbers = random.sample(range(1, rows + 1), iterations)
+        tokens = [fake_token(number) for number in numbers]
+        new_tokens = [fake_token(rows + number) for number in numbers]
+
+        text_lookup = await measure(connection, 'SELECT id FROM bench_text WHERE refresh_token = :token',
+                                    [{'token': token} for token in tokens])
+        digest_lookup = await measure(connection, 'SELECT id FROM bench_digest WHERE refresh_token_hash = :token',
+                                      [{'token': token_digest(token)} for token in tokens])
+        text_rotation = await measure(
+            connection, 'UPDATE bench_text SET refresh_token = :new WHERE refresh_token = :old',
+            [{'old': old, 'new': new} for old, new in zip(tokens, new_tokens)]
+        )
+        digest_rotation = await measure(
+            connection, 'UPDATE bench_digest SET refresh_token_hash = :new WHERE refresh_token_hash = :old',
+            [{'old': token_digest(old), 'new': token_digest(new)} for old, new in zip(tokens, new_tokens)]
+        )
+        await connection.rollback()
+
+    print(f'  lookup: text {text_lookup:.0f} us, digest {digest_lookup:.0f} us')
+    print(f'rotation: text {text_rotation:.0f} us, digest {digest_rotation:.0f} us')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.iterations))
@@ -0,0 +1,79 @@
+"""Нагрузочный тест отзыва пары токенов при logout/refresh: последовательные команды против скрипта.
+
+Раньше каждый logout/refresh делал два EXISTS, два SET и XADD отдельными
+round trip; теперь это один вызов Lua-скрипта. Замеряется задержка на запрос.
+
+Запуск из директории src (нужен Redis из .env):
+
+    python -m benchmarks.revocation --requests 20000 --concurrency 100
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from redis.asyncio import Redis
+
+from core.config import settings
+from db.revocation import RevocationFilter
+
+STREAM = 'bench_revoked_tokens'
+SUBJECT = 'bench'
+
+
+async def legacy_revoke(redis: Redis, access_jti: str, refresh_jti: str, exp: int) -> bool:
+    """Отзыв до оптимизации: четыре команды и публикация в stream по очереди."""
+    if await redis.exists(access_jti) or await redis.exists(refresh_jti):
+        return False
+    ttl = exp - int(time.time())
+    await redis.set(name=access_jti, value=SUBJECT, ex=ttl)
+    await redis.set(name=refresh_jti, value=SUBJECT, ex=ttl)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.xadd(STREAM, {'jti': access_jti})
+        pipe.xadd(STREAM, {'jti': refresh_jti})
+        await pipe.execute()
+    return True
+
+
+async def run(name: str, revoke, requests: int, concurrency: int) -> None:
+    queue = iter(range(requests))
+    latencies = []
+
+    async def client():
+        for _ in queue:
+            exp = int(time.time()) + 60
+            started = time.perf_counter()
+            await revoke(f'bench:{uuid.uuid4()}', f'bench:{uuid.uuid4()}', exp)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f'{name:>6}: {requests / elapsed:8.0f} req/s, p50 {statistics.median(latencies):.2f} ms, '
+          f'p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms')
+
+
+async def main(requests: int, concurrency: int) -> None:
+    redis = Redis(host=settings.redis.host, port=settings.redis.port)
+    revocation = RevocationFilter(redis, STREAM, capacity=requests * 4, error_rate=0.001, retention=60)
+    try:
+        await run('legacy', lambda access, refresh, exp: legacy_revoke(redis, access, refresh, exp),
+                  requests, concurrency)
+        await run('script', lambda access, refresh, exp: revocation.revoke(SUBJECT, (access, exp), (refresh, exp)),
+                  requests, concurrency)
+    finally:
+        async for key in redis.scan_iter('bench:*'):
+            await redis.delete(key)
+        await redis.delete(STREAM)
+        await redis.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
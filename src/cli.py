@@ -7,8 +7,11 @@ from fastapi import HTTPException
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import select
 
-from db.postgres import get_session
+from core.config import settings
+from db import partitions
+from db.postgres import engine, get_session
 from models.schemas import User, Role
+from utils import hashing
 
 app = typer.Typer()
 
@@ -18,7 +21,11 @@ def createsuperuser(username: str,
                     login: str,
                     password: str,
                     email: str):
-    asyncio.run(create_superuser_async(username, login, password, email))
+    hashing.password_hasher = hashing.PasswordHasher(workers=1, queue_size=settings.hashing.queue_size)
+    try:
+        asyncio.run(create_superuser_async(username, login, password, email))
+    finally:
+        hashing.password_hasher.close()
 
 
 async def create_superuser_async(username: str, login: str,
@@ -27,6 +34,7 @@ async def create_superuser_async(username: str, login: str,
         try:
             user = User(username=username, login=login, password=password,
                         email=email, birth_day=None)
+            await user.set_password(password)
             result = await db.execute(select(Role).where(
                 Role.is_admin == False,
                 Role.is_subscriber == False,
@@ -70,5 +78,25 @@ async def db_add_user(db, user):
     await db.refresh(user)
 
 
+@app.command()
+def manage_partitions(months_ahead: int = settings.login_history.partitions_ahead,
+                      retention_months: int = settings.login_history.retention_months,
+                      drop: bool = False):
+    """Создаёт будущие партиции истории входов и отсоединяет (с --drop удаляет) старые."""
+    created, expired = asyncio.run(manage_partitions_async(months_ahead, retention_months, drop))
+    print(f"Created partitions: {', '.join(created) or '-'}")
+    print(f"{'Dropped' if drop else 'Detached'} partitions: {', '.join(expired) or '-'}")
+
+
+async def manage_partitions_async(months_ahead: int, retention_months: int, drop: bool):
+    try:
+        async with engine.begin() as connection:
+            created = await partitions.create_partitions(connection, months_ahead)
+            expired = await partitions.expire_partitions(connection, retention_months, drop)
+        return created, expired
+    finally:
+        await engine.dispose()
+
+
 if __name__ == "__main__":
     app()
@@ -21,6 +21,12 @@ load_dotenv(f"{BASE_DIR}/.env")
 class RedisSettings(BaseSettings):
     host: str = Field(validation_alias='REDIS_HOST')
     port: int = Field(validation_alias='REDIS_PORT')
+    max_connections: int = Field(validation_alias='REDIS_MAX_CONNECTIONS', default=64)
+    pool_timeout: float = Field(validation_alias='REDIS_POOL_TIMEOUT', default=2.0)
+    # Больше, чем блокирующие XREAD фоновых задач (5 секунд)
+    socket_timeout: float = Field(validation_alias='REDIS_SOCKET_TIMEOUT', default=10.0)
+    socket_connect_timeout: float = Field(validation_alias='REDIS_CONNECT_TIMEOUT', default=2.0)
+    health_check_interval: int = Field(validation_alias='REDIS_HEALTH_CHECK_INTERVAL', default=30)
 
 
 class PostgreSQLSettings(BaseSettings):
@@ -29,12 +35,34 @@ class PostgreSQLSettings(BaseSettings):
     password: str = Field(validation_alias='DB_PASSWORD')
     host: str = Field(validation_alias='DB_HOST')
     port: int = Field(validation_alias='DB_PORT')
-    echo: bool =Field(validation_alias='ECHO', default=True)
+    echo: bool = Field(validation_alias='ECHO', default=False)
+    # Бюджет соединений Postgres делится между gunicorn-воркерами
+    workers: int = Field(validation_alias='WEB_WORKERS', default=4)
+    max_connections: int = Field(validation_alias='DB_MAX_CONNECTIONS', default=100)
+    reserved_connections: int = Field(validation_alias='DB_RESERVED_CONNECTIONS', default=10)
+    pool_size: int | None = Field(validation_alias='DB_POOL_SIZE', default=None)
+    max_overflow: int | None = Field(validation_alias='DB_MAX_OVERFLOW', default=None)
+    pool_timeout: float = Field(validation_alias='DB_POOL_TIMEOUT', default=5.0)
+    pool_recycle: int = Field(validation_alias='DB_POOL_RECYCLE', default=1800)
+    pool_pre_ping: bool = Field(validation_alias='DB_POOL_PRE_PING', default=True)
 
     def get_db_url(self):
         dsn = f'postgresql+asyncpg://{self.user}:{self.password}@{self.host}:{self.port}/{self.dbname}'
         return dsn
 
+    def get_pool_options(self) -> dict:
+        # Без явных размеров воркер получает свою долю max_connections: половина постоянно, половина в overflow
+        budget = max(2, (self.max_connections - self.reserved_connections) // self.workers)
+        pool_size = self.pool_size if self.pool_size is not None else budget // 2
+        max_overflow = self.max_overflow if self.max_overflow is not None else budget - pool_size
+        return {
+            'pool_size': pool_size,
+            'max_overflow': max_overflow,
+            'pool_timeout': self.pool_timeout,
+            'pool_recycle': self.pool_recycle,
+            'pool_pre_ping': self.pool_pre_ping,
+        }
+
 
 class YandexClientSettings(BaseSettings):
     client_id: str = Field(validation_alias='CLIENT_ID')
@@ -44,6 +72,53 @@ class YandexClientSettings(BaseSettings):
 class RateLimitSettings(BaseSettings):
     limit: int = Field(validation_alias='LIMIT', default=1000)
     interval: int = Field(validation_alias='INTERVAL', default=60)
+    chunk: int = Field(validation_alias='RATE_LIMIT_CHUNK', default=10)
+    lease_ttl: float = Field(validation_alias='RATE_LIMIT_LEASE_TTL', default=1.0)
+
+
+class HashingSettings(BaseSettings):
+    workers: int = Field(validation_alias='HASH_WORKERS', default=2)
+    queue_size: int = Field(validation_alias='HASH_QUEUE_SIZE', default=64)
+
+
+class LoginHistorySettings(BaseSettings):
+    mode: str = Field(validation_alias='LOGIN_HISTORY_MODE', default='memory')
+    batch_size: int = Field(validation_alias='LOGIN_HISTORY_BATCH_SIZE', default=500)
+    flush_interval: float = Field(validation_alias='LOGIN_HISTORY_FLUSH_INTERVAL', default=0.5)
+    max_pending: int = Field(validation_alias='LOGIN_HISTORY_MAX_PENDING', default=10000)
+    put_timeout: float = Field(validation_alias='LOGIN_HISTORY_PUT_TIMEOUT', default=1.0)
+    stream: str = Field(validation_alias='LOGIN_HISTORY_STREAM', default='login_history')
+    partitions_ahead: int = Field(validation_alias='LOGIN_HISTORY_PARTITIONS_AHEAD', default=3)
+    retention_months: int = Field(validation_alias='LOGIN_HISTORY_RETENTION_MONTHS', default=24)
+
+
+class RevocationSettings(BaseSettings):
+    stream: str = Field(validation_alias='REVOCATION_STREAM', default='revoked_tokens')
+    capacity: int = Field(validation_alias='REVOCATION_FILTER_CAPACITY', default=1_000_000)
+    error_rate: float = Field(validation_alias='REVOCATION_FILTER_ERROR_RATE', default=0.001)
+    # Записи старше срока жизни refresh-токена из stream можно выбрасывать
+    retention: int = Field(validation_alias='REVOCATION_RETENTION', default=30 * 24 * 60 * 60)
+
+
+class RoleRegistrySettings(BaseSettings):
+    poll_interval: float = Field(validation_alias='ROLE_REGISTRY_POLL_INTERVAL', default=5.0)
+
+
+class UserRoleSettings(BaseSettings):
+    # Сколько пользователей можно передать в один запрос POST /user_role/bulk/
+    bulk_limit: int = Field(validation_alias='USER_ROLE_BULK_LIMIT', default=500)
+
+
+class ProfileCacheSettings(BaseSettings):
+    ttl: int = Field(validation_alias='PROFILE_CACHE_TTL', default=300)
+    jitter: float = Field(validation_alias='PROFILE_CACHE_JITTER', default=0.1)
+
+
+class MetricsSettings(BaseSettings):
+    # Общая для всех gunicorn-воркеров директория, через которую /metrics собирает их значения
+    directory: str = Field(validation_alias='METRICS_DIR', default='/tmp/auth_metrics')
+    export_interval: float = Field(validation_alias='METRICS_EXPORT_INTERVAL', default=5.0)
+
 
 class TracingSettings(BaseSettings):
     jaeger_agent_host: str = os.getenv('AGENT_HOST', 'jaeger')
@@ -58,6 +133,13 @@ class Settings(BaseSettings):
     yandex: YandexClientSettings = YandexClientSettings()
     rate_limit: RateLimitSettings = RateLimitSettings()
     tracing: TracingSettings = TracingSettings()
+    hashing: HashingSettings = HashingSettings()
+    login_history: LoginHistorySettings = LoginHistorySettings()
+    revocation: RevocationSettings = RevocationSettings()
+    role_registry: RoleRegistrySettings = RoleRegistrySettings()
+    profile_cache: ProfileCacheSettings = ProfileCacheSettings()
+    user_role: UserRoleSettings = UserRoleSettings()
+    metrics: MetricsSettings = MetricsSettings()
 
 
 settings = Settings()
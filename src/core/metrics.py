@@ -0,0 +1,197 @@
+"""Метрики воркеров в текстовом формате Prometheus.
+
+Каждый gunicorn-воркер считает свои значения, поэтому ко всем сериям
+добавляется метка pid: по ней видно, какой именно воркер упёрся в лимит.
+Воркеры периодически сбрасывают свои значения в общую директорию, и любой
+из них отдаёт на /metrics серии всех воркеров сразу.
+"""
+import asyncio
+import bisect
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_registry: list['Metric'] = []
+
+
+def _format_labels(labels: dict) -> str:
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+class Metric(ABC):
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    @abstractmethod
+    def samples(self):
+        ...
+
+    def snapshot(self) -> dict:
+        pid = os.getpid()
+        return {
+            'name': self.name,
+            'type': self.type,
+            'documentation': self.documentation,
+            'samples': [(name, {**labels, 'pid': pid}, value) for name, labels, value in self.samples()],
+        }
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield f'{self.name}_total', self._labels(key), value
+
+
+class Gauge(Metric):
+    """Значение снимается в момент выгрузки метрик."""
+
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], float | None]):
+        super().__init__(name, documentation)
+        self._collect = collect
+
+    def samples(self):
+        value = self._collect()
+        if value is not None:
+            yield self.name, {}, value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self._buckets = buckets
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            # Счётчики по корзинам, затем +Inf, сумма
+            series = self._values[key] = [0] * (len(self._buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self._buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for key, series in self._values.items():
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip((*self._buckets, '+Inf'), series):
+                cumulative += count
+                yield f'{self.name}_bucket', {**labels, 'le': bound}, cumulative
+            yield f'{self.name}_sum', labels, series[-1]
+            yield f'{self.name}_count', labels, cumulative
+
+
+def snapshot() -> list[dict]:
+    return [metric.snapshot() for metric in _registry]
+
+
+def render(directory: str | None = None, stale_after: float = 0) -> str:
+    """Текущие значения этого воркера и последние сброшенные значения остальных.
+
+    Файлы, которые не обновлялись дольше stale_after секунд, принадлежат
+    завершившимся воркерам: они пропускаются и удаляются.
+    """
+    families: dict[str, dict] = {}
+    for family in [*snapshot(), *_read_workers(directory, stale_after)]:
+        merged = families.setdefault(family['name'], {**family, 'samples': []})
+        merged['samples'].extend(family['samples'])
+    lines = []
+    for family in families.values():
+        lines.append(f'# HELP {family["name"]} {family["documentation"]}')
+        lines.append(f'# TYPE {family["name"]} {family["type"]}')
+        lines.extend(f'{name}{_format_labels(labels)} {value}' for name, labels, value in family['samples'])
+    return '\n'.join(lines) + '\n'
+
+
+def _read_workers(directory: str | None, stale_after: float) -> list[dict]:
+    if not directory:
+        return []
+    own = f'{os.getpid()}.json'
+    deadline = time.time() - stale_after
+    families = []
+    for path in Path(directory).glob('*.json'):
+        try:
+            if path.name == own:
+                continue
+            if path.stat().st_mtime < deadline:
+                path.unlink(missing_ok=True)
+                continue
+            families.extend(orjson.loads(path.read_bytes()))
+        except (OSError, orjson.JSONDecodeError):
+            # Файл мог исчезнуть или записываться прямо сейчас
+            continue
+    return families
+
+
+class MetricsExporter:
+    """Раз в interval секунд сбрасывает метрики воркера в файл <pid>.json в общей директории."""
+
+    def __init__(self, directory: str, interval: float):
+        self._directory = Path(directory)
+        self._interval = interval
+        self._path = self._directory / f'{os.getpid()}.json'
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._directory.mkdir(parents=True, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._path.unlink(missing_ok=True)
+
+    def export(self) -> None:
+        # Запись через временный файл: читатель не увидит наполовину записанный JSON
+        tmp = self._path.with_suffix('.tmp')
+        tmp.write_bytes(orjson.dumps(snapshot()))
+        os.replace(tmp, self._path)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.export()
+            except OSError:
+                logger.exception('Could not export metrics to %s', self._directory)
+            await asyncio.sleep(self._interval)
+
+
+exporter: MetricsExporter | None = None
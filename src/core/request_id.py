@@ -0,0 +1,41 @@
+import orjson
+from opentelemetry import trace
+
+REQUEST_ID_HEADER = b'x-request-id'
+MISSING_REQUEST_ID = orjson.dumps({'detail': 'X-Request-Id is required'})
+
+
+class RequestIdMiddleware:
+    """Требует X-Request-Id до запуска обработчика и кладёт его в span запроса.
+
+    Запрос без заголовка получает 400 сразу, не доходя до базы и хеширования паролей.
+    Пути из exempt (например, /metrics для Prometheus) заголовок не требуют.
+    Span создаётся только при включённой трассировке.
+    """
+
+    def __init__(self, app, tracing: bool, exempt: tuple[str, ...] = ()):
+        self.app = app
+        self.tracing = tracing
+        self.exempt = exempt
+        self.tracer = trace.get_tracer(__name__) if tracing else None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] in self.exempt:
+            return await self.app(scope, receive, send)
+
+        request_id = next((value for name, value in scope['headers'] if name == REQUEST_ID_HEADER), None)
+        if not request_id:
+            await send({
+                'type': 'http.response.start',
+                'status': 400,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(MISSING_REQUEST_ID)).encode())],
+            })
+            await send({'type': 'http.response.body', 'body': MISSING_REQUEST_ID})
+            return
+
+        if not self.tracing:
+            return await self.app(scope, receive, send)
+        with self.tracer.start_as_current_span('request_id_middleware') as span:
+            span.set_attribute('http.request_id', request_id.decode('latin-1'))
+            await self.app(scope, receive, send)
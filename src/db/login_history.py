@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+from sqlalchemy import DateTime, bindparam, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.postgres import async_session
+from models.schemas import LoginHistory, LoginStat, User, get_device_type
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class LoginHistoryWriter:
+    """Копит записи истории входов в памяти и пишет их в Postgres пачками.
+
+    Пачка уходит одним multi-row INSERT, как только набралось batch_size записей
+    или прошло flush_interval секунд с первой записи в пачке. Если очередь
+    заполнена и за put_timeout место не освободилось, запрос получает 503.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int, put_timeout: float):
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._put_timeout = put_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def add(self, user_id, user_agent: str) -> None:
+        row = {'user_id': user_id, 'user_agent': user_agent, 'auth_date': datetime.utcnow()}
+        try:
+            await asyncio.wait_for(self._queue.put(row), self._put_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                                detail='Login history queue is full, try again later',
+                                headers={'Retry-After': '1'})
+
+    async def close(self) -> None:
+        """Дописывает всё, что осталось в очереди, и останавливает фоновую задачу."""
+        await self._queue.put(_STOP)
+        await self._task
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            batch = []
+            row = await self._queue.get()
+            deadline = loop.time() + self._flush_interval
+            while row is not _STOP:
+                batch.append(row)
+                if len(batch) >= self._batch_size:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                stopping = True
+            if batch:
+                await self.flush(batch)
+
+    @staticmethod
+    async def flush(rows: list[dict]) -> list[bool]:
+        """Пишет пачку и возвращает по каждой записи, обработана ли она.
+
+        Обработанной считается записанная запись и заведомо битая, которую повторять
+        бесполезно. Записи, не дошедшие до базы из-за её недоступности, — нет.
+        """
+        values = [
+            {
+                'user_id': row['user_id'],
+                'user_agent': row['user_agent'],
+                'user_device_type': get_device_type(row['user_agent']),
+                'auth_date': row['auth_date'],
+            }
+            for row in rows
+        ]
+        try:
+            async with async_session() as session:
+                await LoginHistoryWriter.write(session, values)
+                await session.commit()
+            return [True] * len(values)
+        except Exception:
+            # Одна битая запись (например, пользователь уже удалён) не должна утащить всю пачку
+            logger.exception('Batch insert of %s login history rows failed, retrying one by one', len(values))
+        done = []
+        for value in values:
+            try:
+                async with async_session() as session:
+                    await LoginHistoryWriter.write(session, [value])
+                    await session.commit()
+                done.append(True)
+            except IntegrityError:
+                logger.exception('Dropping login history row for user %s', value['user_id'])
+                done.append(True)
+            except Exception:
+                logger.exception('Could not write login history row for user %s', value['user_id'])
+                done.append(False)
+        return done
+
+    @staticmethod
+    async def write(session: AsyncSession, values: list[dict]) -> None:
+        """Пишет историю и в той же транзакции обновляет счётчики входов и last_login_at."""
+        await session.execute(insert(LoginHistory), values)
+
+        stats, last_logins = {}, {}
+        for value in values:
+            key = (value['user_id'], value['user_device_type'], value['auth_date'].date())
+            count, last = stats.get(key, (0, value['auth_date']))
+            stats[key] = (count + 1, max(last, value['auth_date']))
+            last_logins[value['user_id']] = max(last_logins.get(value['user_id'], value['auth_date']),
+                                                value['auth_date'])
+
+        # Строки блокируются в порядке ключей: параллельные пачки разных воркеров
+        # иначе могут взять одних и тех же пользователей в обратном порядке и зайти в deadlock
+        upsert = pg_insert(LoginStat).values([
+            {'user_id': user_id, 'user_device_type': device, 'day': day, 'count': count, 'last_login_at': last}
+            for (user_id, device, day), (count, last) in sorted(stats.items())
+        ])
+        await session.execute(upsert.on_conflict_do_update(
+            index_elements=[LoginStat.user_id, LoginStat.user_device_type, LoginStat.day],
+            set_={
+                'count': LoginStat.count + upsert.excluded['count'],
+                'last_login_at': func.greatest(LoginStat.last_login_at, upsert.excluded.last_login_at),
+            },
+        ))
+        users = User.__table__
+        last = bindparam('last', type_=DateTime)
+        await session.execute(
+            update(users)
+            .where(users.c.id == bindparam('user'))
+            .values(last_login_at=func.greatest(func.coalesce(users.c.last_login_at, last), last)),
+            [{'user': user_id, 'last': last} for user_id, last in sorted(last_logins.items())],
+        )
+
+
+class RedisLoginHistoryWriter(LoginHistoryWriter):
+    """Вариант с записью через Redis stream: запись переживает рестарт воркера.
+
+    Запрос делает только XADD, а фоновые задачи всех воркеров читают stream
+    через consumer group и подтверждают записи после вставки в Postgres.
+    Буфером здесь служит сам Redis, поэтому ограничения очереди не действуют.
+    """
+
+    group = 'login_history_writers'
+    # Через сколько миллисекунд неподтверждённая запись считается брошенной упавшим воркером
+    # или незаписанной из-за ошибки Postgres; с тем же периодом такие записи забираются повторно
+    claim_idle_ms = 30_000
+
+    def __init__(self, redis: Redis, stream: str, batch_size: int, flush_interval: float):
+        super().__init__(batch_size, flush_interval, max_pending=0, put_timeout=0)
+        self._redis = redis
+        self._stream = stream
+        self._consumer = f'{socket.gethostname()}-{os.getpid()}'
+        self._stopping = False
+
+    async def start(self) -> None:
+        try:
+            await self._redis.xgroup_create(self._stream, self.group, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+        await super().start()
+
+    async def add(self, user_id, user_agent: str) -> None:
+        await self._redis.xadd(self._stream, {
+            'user_id': str(user_id),
+            'user_agent': user_agent,
+            'auth_date': datetime.utcnow().isoformat(),
+        })
+
+    async def close(self) -> None:
+        self._stopping = True
+        await self._task
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_claim = loop.time()
+        while not self._stopping:
+            try:
+                if loop.time() >= next_claim:
+                    await self._claim_pending()
+                    next_claim = loop.time() + self.claim_idle_ms / 1000
+                response = await self._redis.xreadgroup(self.group, self._consumer, {self._stream: '>'},
+                                                        count=self._batch_size,
+                                                        block=int(self._flush_interval * 1000))
+                for _, entries in response:
+                    await self._flush_entries(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Ошибка Redis не должна останавливать чтение: неподтверждённые записи заберёт _claim_pending
+                logger.exception('Login history stream consumer failed, retrying')
+                await asyncio.sleep(1)
+
+    async def _claim_pending(self) -> None:
+        """Забирает все записи, которые слишком долго остаются неподтверждёнными."""
+        start_id = '0-0'
+        while True:
+            start_id, claimed, *_ = await self._redis.xautoclaim(self._stream, self.group, self._consumer,
+                                                                 min_idle_time=self.claim_idle_ms,
+                                                                 start_id=start_id, count=self._batch_size)
+            await self._flush_entries(claimed)
+            if start_id in (b'0-0', '0-0'):
+                return
+
+    async def _flush_entries(self, entries) -> None:
+        if not entries:
+            return
+        rows, ids = [], []
+        for entry_id, fields in entries:
+            if not fields:
+                # Запись удалили из stream, пока она ждала подтверждения
+                await self._redis.xack(self._stream, self.group, entry_id)
+                continue
+            fields = {key.decode(): value.decode() for key, value in fields.items()}
+            fields['user_id'] = uuid.UUID(fields['user_id'])
+            fields['auth_date'] = datetime.fromisoformat(fields['auth_date'])
+            rows.append(fields)
+            ids.append(entry_id)
+        if not rows:
+            return
+        done = await self.flush(rows)
+        # Незаписанные записи остаются в pending и будут забраны повторно
+        ids = [entry_id for entry_id, written in zip(ids, done) if written]
+        if ids:
+            await self._redis.xack(self._stream, self.group, *ids)
+            await self._redis.xdel(self._stream, *ids)
+
+
+login_history_writer: LoginHistoryWriter | None = None
+
+
+async def get_login_history_writer() -> LoginHistoryWriter:
+    return login_history_writer
@@ -0,0 +1,77 @@
+"""Помесячные партиции login_histories.
+
+Каждая партиция по типу устройства разбита по auth_date на месяцы. Месяцы
+создаются заранее, а партиции старше срока хранения отсоединяются или удаляются
+целиком, без массового DELETE. Строки, для месяца которых партиции ещё нет,
+попадают в партицию DEFAULT и переносятся при создании месяца.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Значение user_device_type -> партиция
+DEVICE_PARTITIONS = {
+    'smart_tv': 'login_histories_smart',
+    'mobile': 'login_histories_mobile',
+    'desktop': 'login_histories_desktop',
+}
+
+
+def month_start(day: date, shift: int = 0) -> date:
+    months = day.year * 12 + day.month - 1 + shift
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f'{table}_{month:%Y_%m}'
+
+
+async def create_partitions(connection: AsyncConnection, months_ahead: int) -> list[str]:
+    """Создаёт партиции с текущего месяца на months_ahead вперёд."""
+    created = []
+    today = date.today()
+    for table in DEVICE_PARTITIONS.values():
+        for shift in range(months_ahead + 1):
+            start, end = month_start(today, shift), month_start(today, shift + 1)
+            name = partition_name(table, start)
+            if await connection.scalar(text('SELECT to_regclass(:name)'), {'name': name}):
+                continue
+            # Строки этого месяца могли уже попасть в DEFAULT: переносим их, иначе ATTACH не пройдёт
+            await connection.execute(text(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)'))
+            await connection.execute(
+                text(f'WITH moved AS (DELETE FROM {table}_default '
+                     f'WHERE auth_date >= :start AND auth_date < :end RETURNING *) '
+                     f'INSERT INTO {name} SELECT * FROM moved'),
+                {'start': start, 'end': end},
+            )
+            await connection.execute(
+                text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')")
+            )
+            created.append(name)
+    return created
+
+
+async def expire_partitions(connection: AsyncConnection, retention_months: int, drop: bool) -> list[str]:
+    """Отсоединяет (или удаляет) месяцы, целиком вышедшие за срок хранения."""
+    expired = []
+    cutoff = month_start(date.today(), -retention_months)
+    for table in DEVICE_PARTITIONS.values():
+        partitions = await connection.scalars(
+            text('SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+                 'WHERE i.inhparent = CAST(:table AS regclass)'),
+            {'table': table},
+        )
+        for name in partitions.all():
+            try:
+                month = datetime.strptime(name.removeprefix(f'{table}_'), '%Y_%m').date()
+            except ValueError:
+                continue
+            if month_start(month, 1) > cutoff:
+                continue
+            await connection.execute(text(f'ALTER TABLE {table} DETACH PARTITION {name}'))
+            if drop:
+                await connection.execute(text(f'DROP TABLE {name}'))
+            expired.append(name)
+        await connection.execute(text(f'DELETE FROM {table}_default WHERE auth_date < :cutoff'), {'cutoff': cutoff})
+    return expired
@@ -1,20 +1,59 @@
+import time
+
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue, Empty
+from starlette.requests import Request
 
+from core import metrics
 from core.config import settings
+from db.unit_of_work import SESSION_STATE
+
+POOL_WAIT = metrics.Histogram('db_pool_wait_seconds', 'Time spent waiting for a free Postgres connection')
+POOL_TIMEOUTS = metrics.Counter('db_pool_timeouts', 'Checkouts that gave up waiting for a Postgres connection')
+
+
+class _TimedQueue(AsyncAdaptedQueue):
+    def get(self, block: bool = True, timeout: float | None = None):
+        started = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        except Empty:
+            # Без ожидания пул просто откроет соединение сверх pool_size, это не таймаут
+            if block:
+                POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет, сколько запросы ждут свободное соединение."""
+
+    _queue_class = _TimedQueue
+
 
 # Создаём базовый класс для будущих моделей
 Base = declarative_base()
 # Создаём движок
 # Настройки подключения к БД передаём из переменных окружения, которые заранее загружены в файл настроек
-engine = create_async_engine(settings.db.get_db_url(), echo=settings.db.echo, future=True)
+engine = create_async_engine(settings.db.get_db_url(), echo=settings.db.echo, future=True,
+                             poolclass=InstrumentedPool, **settings.db.get_pool_options())
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
+metrics.Gauge('db_pool_size', 'Persistent Postgres connections in the pool', lambda: engine.pool.size())
+metrics.Gauge('db_pool_checked_out', 'Postgres connections in use', lambda: engine.pool.checkedout())
+metrics.Gauge('db_pool_overflow', 'Postgres connections opened over pool_size', lambda: max(0, engine.pool.overflow()))
+
 
 # Функция понадобится при внедрении зависимостей
 # Dependency
-async def get_session() -> AsyncSession:
+async def get_session(request: Request = None) -> AsyncSession:
     async with async_session() as session:
+        if request is not None:
+            # Коммит делает UnitOfWorkRoute до отправки ответа, а не сервисы
+            setattr(request.state, SESSION_STATE, session)
         try:
             yield session
         except Exception:
@@ -0,0 +1,65 @@
+import logging
+import random
+
+import orjson
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from core import metrics
+from models.users import UserProfileResult
+
+logger = logging.getLogger(__name__)
+
+REQUESTS = metrics.Counter('profile_cache_requests', 'Profile cache lookups by result', ('result',))
+
+
+class ProfileCache:
+    """Сериализованный профиль пользователя в Redis.
+
+    Профиль хранится готовыми orjson-байтами и отдаётся клиенту как есть.
+    К TTL добавляется случайная доля jitter, чтобы ключи, записанные одновременно,
+    не истекали одной волной. Кэш необязателен: при ошибке Redis профиль читается из Postgres.
+    """
+
+    prefix = 'profile:'
+
+    def __init__(self, redis: Redis, ttl: int, jitter: float):
+        self._redis = redis
+        self._ttl = ttl
+        self._jitter = jitter
+
+    async def get(self, user_id) -> bytes | None:
+        try:
+            profile = await self._redis.get(f'{self.prefix}{user_id}')
+        except RedisError:
+            logger.warning('Profile cache is unavailable, reading from Postgres', exc_info=True)
+            profile = None
+        REQUESTS.inc(result='hit' if profile is not None else 'miss')
+        return profile
+
+    async def set(self, user_id, profile: UserProfileResult) -> bytes:
+        """Кладёт профиль, прочитанный из Postgres при промахе; ошибка Redis здесь не мешает ответу."""
+        data = orjson.dumps(profile.model_dump())
+        try:
+            await self._redis.set(f'{self.prefix}{user_id}', data, ex=self._expiry())
+        except RedisError:
+            logger.warning('Could not cache profile of user %s', user_id, exc_info=True)
+        return data
+
+    async def replace(self, user_id, profile: UserProfileResult) -> None:
+        """Перезаписывает профиль после изменения; ошибку не глушим, как и в invalidate."""
+        await self._redis.set(f'{self.prefix}{user_id}', orjson.dumps(profile.model_dump()), ex=self._expiry())
+
+    async def invalidate(self, user_id) -> None:
+        # Ошибку не глушим: устаревший профиль хуже, чем неудачный запрос на изменение
+        await self._redis.delete(f'{self.prefix}{user_id}')
+
+    def _expiry(self) -> int:
+        return int(self._ttl * (1 + random.uniform(0, self._jitter)))
+
+
+profile_cache: ProfileCache | None = None
+
+
+async def get_profile_cache() -> ProfileCache:
+    return profile_cache
@@ -1,8 +1,78 @@
-from redis.asyncio import Redis
+import time
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+
+from core import metrics
+from core.config import RedisSettings
+
+COMMAND_LATENCY = metrics.Histogram('redis_command_seconds', 'Redis command latency including pool wait',
+                                    ('command',))
+POOL_WAIT = metrics.Histogram('redis_pool_wait_seconds', 'Time spent waiting for a free Redis connection')
 
 redis: Redis | None = None
 
 
+class InstrumentedPool(BlockingConnectionPool):
+    async def get_connection(self, command_name, *keys, **options):
+        started = time.perf_counter()
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            COMMAND_LATENCY.observe(time.perf_counter() - started, command='PIPELINE')
+
+
+class InstrumentedRedis(Redis):
+    """Клиент, который пишет задержку каждой команды в метрики."""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            COMMAND_LATENCY.observe(time.perf_counter() - started, command=str(args[0]).upper())
+
+    def pipeline(self, transaction: bool = True, shard_hint: str | None = None) -> Pipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def create_redis(config: RedisSettings) -> Redis:
+    """Один пул соединений на воркер: его делят лимитер, отзыв токенов, реестр ролей и кэши."""
+    pool = InstrumentedPool(
+        host=config.host,
+        port=config.port,
+        max_connections=config.max_connections,
+        timeout=config.pool_timeout,
+        socket_timeout=config.socket_timeout,
+        socket_connect_timeout=config.socket_connect_timeout,
+        health_check_interval=config.health_check_interval,
+    )
+    return InstrumentedRedis.from_pool(pool)
+
+
+def _pool_in_use() -> int | None:
+    return len(redis.connection_pool._in_use_connections) if redis else None
+
+
+def _pool_created() -> int | None:
+    if not redis:
+        return None
+    return len(redis.connection_pool._in_use_connections) + len(redis.connection_pool._available_connections)
+
+
+metrics.Gauge('redis_pool_in_use', 'Redis connections in use, including blocking readers', _pool_in_use)
+metrics.Gauge('redis_pool_open', 'Open Redis connections', _pool_created)
+
+
 # Функция понадобится при внедрении зависимостей
 async def get_redis() -> Redis:
     return redis
@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from datetime import datetime, timezone
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+
+from db.postgres import async_session
+from models.schemas import User
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.count = 0
+        self._size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self._hashes = max(1, round(self._size / capacity * math.log(2)))
+        self._bits = bytearray((self._size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self._size for i in range(self._hashes))
+
+    def add(self, item: str) -> None:
+        added = False
+        for position in self._positions(item):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                added = True
+        # Повторное добавление того же jti (свой отзыв, прочитанный из stream) не считаем
+        if added:
+            self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+# Проверка, запись jti с TTL и публикация в stream одной атомарной операцией
+REVOKE = """
+for i = 2, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        return 0
+    end
+end
+for i = 2, #KEYS do
+    redis.call('SET', KEYS[i], ARGV[1], 'EX', ARGV[i + 1])
+    redis.call('XADD', KEYS[1], 'MINID', '~', ARGV[2], '*', 'jti', KEYS[i])
+end
+return 1
+"""
+
+# Эпоха пользователя (в миллисекундах) только растёт: повторный full logout не может её откатить
+REVOKE_USER = """
+local epoch = math.max(tonumber(redis.call('GET', KEYS[2]) or 0), tonumber(ARGV[2]))
+redis.call('SET', KEYS[2], epoch, 'EX', ARGV[4])
+redis.call('XADD', KEYS[1], 'MINID', '~', ARGV[3], '*', 'user', ARGV[1], 'epoch_ms', epoch)
+return epoch
+"""
+
+
+class RevocationFilter:
+    """Локальный bloom-фильтр отозванных jti, который реплицируется через Redis stream.
+
+    Каждый отзыв пишется в stream, а фоновая задача каждого воркера дочитывает его
+    и добавляет jti в свой фильтр. Если jti в фильтре нет, токен точно не отозван
+    и в Redis можно не ходить; при попадании в фильтр решение принимает Redis.
+    Пока фильтр не синхронизирован со stream, все проверки идут в Redis.
+
+    Через тот же stream расходятся эпохи пользователей в миллисекундах: токены,
+    выпущенные не позже эпохи (по claim iat_ms), недействительны. Эпоха хранится в Postgres, оттуда
+    фильтр заполняется при старте, даже если Redis потерял данные.
+    """
+
+    batch = 1000
+    epoch_prefix = 'tokens_valid_after_ms:'
+
+    def __init__(self, redis: Redis, stream: str, capacity: int, error_rate: float, retention: int):
+        self._redis = redis
+        self._stream = stream
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._retention = retention
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._last_id = '0-0'
+        self._ready = False
+        self._task: asyncio.Task | None = None
+        self._epochs: dict[str, int] = {}
+        self._revoke = redis.register_script(REVOKE)
+        self._revoke_user = redis.register_script(REVOKE_USER)
+
+    async def start(self) -> None:
+        try:
+            await self._load_epochs()
+        except Exception:
+            logger.exception('Could not load user token epochs from Postgres')
+        try:
+            await self._rebuild()
+        except Exception:
+            logger.exception('Could not load revoked tokens, falling back to Redis lookups')
+        self._task = asyncio.create_task(self._follow())
+
+    async def close(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def is_revoked(self, jti: str) -> bool:
+        if self._ready and jti not in self._bloom:
+            return False
+        return bool(await self._redis.exists(jti))
+
+    async def issued_before_epoch(self, subject: str, iat_ms: int) -> bool:
+        if self._ready:
+            epoch = self._epochs.get(subject)
+        else:
+            epoch = await self._redis.get(f'{self.epoch_prefix}{subject}')
+        return epoch is not None and iat_ms <= int(epoch)
+
+    async def revoke_user(self, subject: str, epoch_ms: int) -> None:
+        """Отзывает все токены пользователя, выпущенные не позже epoch_ms, одной записью."""
+        min_id = f'{int((time.time() - self._retention) * 1000)}-0'
+        epoch = await self._revoke_user(keys=[self._stream, f'{self.epoch_prefix}{subject}'],
+                                        args=[subject, epoch_ms, min_id, self._retention])
+        self._set_epoch(subject, int(epoch))
+
+    async def revoke(self, subject: str, *tokens: tuple[str, int]) -> bool:
+        """Атомарно отзывает пары (jti, exp) за один round trip.
+
+        Возвращает False, если хотя бы один jti уже отозван: тогда ничего не пишется,
+        и два параллельных refresh одним токеном не пройдут оба.
+        """
+        now = time.time()
+        # Старые записи stream обрезаются: к этому времени отозванные ими токены уже истекли
+        min_id = f'{int((now - self._retention) * 1000)}-0'
+        ttls = [max(1, int(exp - now)) for _, exp in tokens]
+        jtis = [jti for jti, _ in tokens]
+        if not await self._revoke(keys=[self._stream, *jtis], args=[subject, min_id, *ttls]):
+            return False
+        for jti in jtis:
+            self._bloom.add(jti)
+        return True
+
+    def _set_epoch(self, subject: str, epoch: int) -> None:
+        if epoch > self._epochs.get(subject, 0):
+            self._epochs[subject] = epoch
+
+    def _apply(self, bloom: BloomFilter, fields: dict) -> None:
+        if b'jti' in fields:
+            bloom.add(fields[b'jti'].decode())
+        elif b'epoch_ms' in fields:
+            self._set_epoch(fields[b'user'].decode(), int(fields[b'epoch_ms']))
+        else:
+            # Записи, сделанные до перехода на миллисекунды
+            self._set_epoch(fields[b'user'].decode(), int(fields[b'epoch']) * 1000)
+
+    async def _load_epochs(self) -> None:
+        since = datetime.fromtimestamp(time.time() - self._retention, tz=timezone.utc).replace(tzinfo=None)
+        async with async_session() as session:
+            result = await session.execute(
+                select(User.id, User.tokens_valid_after).where(User.tokens_valid_after > since)
+            )
+            for user_id, valid_after in result:
+                self._set_epoch(str(user_id), round(valid_after.replace(tzinfo=timezone.utc).timestamp() * 1000))
+
+    async def _rebuild(self) -> None:
+        """Заново строит фильтр по всему stream, например когда он переполнился.
+
+        Ёмкость берётся с запасом от длины stream: иначе фильтр того же размера
+        сразу оказался бы переполнен и перестраивался бы на каждом чтении.
+        """
+        capacity = max(self._capacity, 2 * await self._redis.xlen(self._stream))
+        bloom = BloomFilter(capacity, self._error_rate)
+        start, last_id = '-', self._last_id
+        while entries := await self._redis.xrange(self._stream, min=start, count=self.batch):
+            for entry_id, fields in entries:
+                self._apply(bloom, fields)
+                last_id = entry_id
+            start = f'({last_id.decode()}'
+        self._bloom, self._last_id, self._ready = bloom, last_id, True
+
+    async def _follow(self) -> None:
+        while True:
+            try:
+                response = await self._redis.xread({self._stream: self._last_id}, count=self.batch, block=5000)
+                received = 0
+                for _, entries in response:
+                    for entry_id, fields in entries:
+                        self._apply(self._bloom, fields)
+                        self._last_id = entry_id
+                        received += 1
+                # Пока дочитываем отставание, фильтр неполный и проверки идут в Redis
+                self._ready = received < self.batch
+                if self._bloom.count > self._bloom.capacity:
+                    await self._rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Lost revoked tokens stream, falling back to Redis lookups')
+                self._ready = False
+                await asyncio.sleep(1)
+
+
+revocation_filter: RevocationFilter | None = None
+
+
+async def get_revocation_filter() -> RevocationFilter:
+    return revocation_filter
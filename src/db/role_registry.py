@@ -0,0 +1,101 @@
+import asyncio
+import logging
+
+from redis.asyncio import Redis
+from sqlalchemy import select
+
+from db.postgres import async_session
+from models.roles import RoleInDB
+from models.schemas import Role
+
+logger = logging.getLogger(__name__)
+
+
+class RoleRegistry:
+    """Таблица ролей в памяти воркера.
+
+    Роли меняются редко, поэтому проверки прав читают их отсюда, а не из Postgres.
+    После изменения роли сервис увеличивает версию в Redis и рассылает её в канал;
+    остальные воркеры перечитывают таблицу. Версия дополнительно сверяется раз
+    в poll_interval секунд, так что пропущенное сообщение тоже приводит к перезагрузке.
+    """
+
+    channel = 'roles:invalidate'
+    version_key = 'roles:version'
+    # Версии отдельных ролей: попадают в access-токен и делают его устаревшим после изменения роли
+    role_versions_key = 'roles:versions'
+
+    def __init__(self, redis: Redis, poll_interval: float):
+        self._redis = redis
+        self._poll_interval = poll_interval
+        self._roles: dict[int, RoleInDB] = {}
+        self._role_versions: dict[int, int] = {}
+        self._version: int | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        try:
+            await self.reload()
+        except Exception:
+            logger.exception('Could not load roles, permission checks will read them from Postgres')
+        self._task = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def get(self, role_id: int) -> RoleInDB | None:
+        return self._roles.get(role_id)
+
+    def role_version(self, role_id: int) -> int:
+        return self._role_versions.get(role_id, 0)
+
+    async def reload(self) -> None:
+        # Версию читаем до ролей: если роль поменяют между запросами, следующая сверка это заметит
+        async with self._redis.pipeline(transaction=True) as pipe:
+            version, role_versions = await pipe.get(self.version_key).hgetall(self.role_versions_key).execute()
+        async with async_session() as session:
+            roles = (await session.execute(select(Role))).scalars().all()
+        self._roles = {role.id: RoleInDB(**role.__dict__) for role in roles}
+        self._role_versions = {int(role_id): int(value) for role_id, value in role_versions.items()}
+        self._version = int(version or 0)
+
+    async def invalidate(self, role_id: int | None = None) -> None:
+        """Рассылает изменение ролей; с role_id ещё и инвалидирует выданные с этой ролью токены."""
+        async with self._redis.pipeline(transaction=True) as pipe:
+            if role_id is not None:
+                pipe.hincrby(self.role_versions_key, role_id, 1)
+            pipe.incr(self.version_key)
+            *_, version = await pipe.execute()
+        await self._redis.publish(self.channel, version)
+        await self.reload()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    while True:
+                        message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                                           timeout=self._poll_interval)
+                        if message:
+                            version = int(message['data'])
+                        else:
+                            version = int(await self._redis.get(self.version_key) or 0)
+                        if version != self._version:
+                            await self.reload()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Role registry lost Redis or Postgres, retrying')
+                await asyncio.sleep(self._poll_interval)
+
+
+role_registry: RoleRegistry | None = None
+
+
+async def get_role_registry() -> RoleRegistry:
+    return role_registry
@@ -0,0 +1,70 @@
+"""Одна транзакция на запрос.
+
+Сервисы только добавляют и меняют объекты в сессии запроса (flush — лишь когда нужен
+сгенерированный базой id или ошибка уникальности). UnitOfWorkRoute коммитит сессию
+один раз, после обработчика и до отправки ответа, и затем выполняет действия,
+отложенные через after_commit: инвалидацию кэшей, реестра ролей, эпох отзыва.
+"""
+from typing import Awaitable, Callable
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session
+from starlette.requests import Request
+from starlette.responses import Response
+
+SESSION_STATE = 'db_session'
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_writes(state: ORMExecuteState) -> None:
+    # UPDATE/DELETE/INSERT через execute не попадают в session.dirty, отмечаем их сами
+    if state.is_insert or state.is_update or state.is_delete:
+        state.session.info['writes'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_flushed(session: Session, flush_context) -> None:
+    # После flush session.new пуст, а INSERT из flush не проходит через do_orm_execute
+    session.info['writes'] = True
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], Awaitable]) -> None:
+    """Откладывает побочный эффект до успешного коммита транзакции запроса."""
+    session.info.setdefault('after_commit', []).append(callback)
+
+
+def has_changes(session: AsyncSession) -> bool:
+    return bool(session.info.get('writes') or session.new or session.dirty or session.deleted)
+
+
+async def commit(session: AsyncSession) -> None:
+    """Коммитит, только если были изменения: чтение не тратит COMMIT и не закрывает курсоры выгрузки.
+
+    Отложенные действия выполняются только после настоящего коммита.
+    """
+    callbacks = session.info.pop('after_commit', [])
+    if not has_changes(session):
+        return
+    await session.commit()
+    session.info.pop('writes', None)
+    for callback in callbacks:
+        await callback()
+
+
+class UnitOfWorkRoute(APIRoute):
+    """Маршрут, который коммитит сессию запроса перед отправкой ответа."""
+
+    def get_route_handler(self) -> Callable[[Request], Awaitable[Response]]:
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            response = await handler(request)
+            # Сессию кладёт в state зависимость get_session; при исключении коммита нет, get_session откатит
+            session = request.scope.get('state', {}).get(SESSION_STATE)
+            if session is not None:
+                await commit(session)
+            return response
+
+        return route_handler
@@ -10,4 +10,4 @@ done
 
 alembic upgrade head
 
-gunicorn main:app --workers 4 --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:8002
+gunicorn main:app --workers ${WEB_WORKERS:-4} --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:8002
@@ -1,33 +1,190 @@
+import asyncio
+import math
+import time
+from functools import wraps
 from http import HTTPStatus
+from typing import NamedTuple
 
 from fastapi import Request, HTTPException
-from redis import Redis
-from functools import wraps
+from redis.asyncio import Redis
+
 from core.config import settings
+from db import redis
+
+# Token bucket: ёмкость limit, полностью восполняется за interval секунд.
+# Возврат неизрасходованной аренды, пополнение, списание и продление TTL
+# выполняются атомарно за один round trip. Время берётся у Redis, чтобы часы
+# воркеров и нод не расходились. Списывается столько токенов, сколько есть, но не больше cost.
+TOKEN_BUCKET = """
+local capacity = tonumber(ARGV[1])
+local rate = capacity / (tonumber(ARGV[2]) * 1000)
+local cost = tonumber(ARGV[3])
+local refund = tonumber(ARGV[4])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate + refund)
+
+local granted = math.min(cost, math.floor(tokens))
+tokens = tokens - granted
+
+local reset = math.ceil((capacity - tokens) / rate)
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], reset + 1000)
+
+local retry_after = 0
+if granted == 0 then
+    retry_after = math.ceil((1 - tokens) / rate)
+end
+return {granted, math.floor(tokens), reset, retry_after}
+"""
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: int
+    reset: float
+    retry_after: float
+
+
+class _Lease:
+    __slots__ = ('tokens', 'expires', 'blocked_until', 'remaining', 'reset_at', 'lock')
+
+    def __init__(self):
+        self.tokens = 0
+        self.expires = 0.0
+        self.blocked_until = 0.0
+        self.remaining = 0
+        self.reset_at = 0.0
+        self.lock = asyncio.Lock()
+
+
+class RateLimiter:
+    """Двухуровневый лимитер: локальный bucket воркера поверх общего bucket в Redis.
+
+    Воркер арендует у Redis сразу chunk токенов и тратит их без сетевых вызовов,
+    поэтому обращений к Redis становится примерно в chunk раз меньше. Токены
+    списываются из общего bucket заранее, так что лимит не превышается ни на одном
+    числе воркеров и нод. Погрешность в обратную сторону: каждый воркер может
+    держать до chunk - 1 неизрасходованных токенов. Через lease_ttl секунд остаток
+    аренды возвращается в Redis вместе со следующим запросом. После отказа воркер
+    отвечает 429 сам, пока не истечёт Retry-After.
+    """
+
+    max_keys = 10000
+
+    def __init__(self, chunk: int, lease_ttl: float):
+        self._chunk = chunk
+        self._lease_ttl = lease_ttl
+        self._leases: dict[str, _Lease] = {}
+        self._scripts = {}
 
+    def _token_bucket(self, client: Redis):
+        # Скрипт привязан к клиенту и вызывается через EVALSHA
+        script = self._scripts.get(id(client))
+        if script is None:
+            script = self._scripts[id(client)] = client.register_script(TOKEN_BUCKET)
+        return script
 
-redis = Redis(host=settings.redis.host, port=settings.redis.port)
+    def _lease(self, key: str) -> _Lease:
+        lease = self._leases.get(key)
+        if lease is None:
+            if len(self._leases) >= self.max_keys:
+                self._prune()
+            lease = self._leases[key] = _Lease()
+        return lease
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key, lease in list(self._leases.items()):
+            if now >= lease.expires and now >= lease.blocked_until and not lease.lock.locked():
+                del self._leases[key]
+
+    def _spend(self, lease: _Lease, now: float) -> Decision | None:
+        if lease.tokens and now < lease.expires:
+            lease.tokens -= 1
+            return Decision(True, lease.remaining + lease.tokens, lease.reset_at - now, 0)
+        if now < lease.blocked_until:
+            return Decision(False, 0, lease.reset_at - now, lease.blocked_until - now)
+        return None
+
+    async def acquire(self, key: str, limit: int, interval: int) -> Decision:
+        lease = self._lease(key)
+        if decision := self._spend(lease, time.monotonic()):
+            return decision
+
+        async with lease.lock:
+            # Пока ждали, аренду мог обновить другой запрос
+            now = time.monotonic()
+            if decision := self._spend(lease, now):
+                return decision
+
+            # Воркер не держит больше десятой части лимита, иначе при малом лимите
+            # одна аренда забирает весь bucket и остальные воркеры отвечают 429
+            chunk = max(1, min(self._chunk, limit // 10))
+            granted, remaining, reset, retry_after = await self._token_bucket(redis.redis)(
+                keys=[key], args=[limit, interval, chunk, lease.tokens]
+            )
+            now = time.monotonic()
+            lease.tokens, lease.remaining, lease.reset_at = 0, remaining, now + reset / 1000
+            if not granted:
+                lease.blocked_until = now + retry_after / 1000
+                return Decision(False, 0, reset / 1000, retry_after / 1000)
+            lease.tokens, lease.expires = granted - 1, now + self._lease_ttl
+            return Decision(True, remaining + lease.tokens, reset / 1000, 0)
+
+
+rate_limiter = RateLimiter(settings.rate_limit.chunk, settings.rate_limit.lease_ttl)
+
+
+def _headers(limit: int, decision: Decision) -> dict:
+    return {
+        'X-RateLimit-Limit': str(limit),
+        'X-RateLimit-Remaining': str(decision.remaining),
+        'X-RateLimit-Reset': str(math.ceil(decision.reset)),
+    }
 
 
 def rate_limit(limit=settings.rate_limit.limit, interval=settings.rate_limit.interval):
     def decorator(func):
         @wraps(func)
         async def wrapper(request: Request, *args, **kwargs):
-            ip_address = request.client.host
-            key = f"rate_limit:{ip_address}"
-
-            current_count = redis.get(key)
-            if current_count is None:
-                redis.setex(key, interval, 1)
-            else:
-                current_count = int(current_count) + 1
-                redis.setex(key, interval, current_count)
-
-                if current_count > limit:
-                    raise HTTPException(status_code=HTTPStatus.TOO_MANY_REQUESTS, detail="Too many requests")
+            decision = await rate_limiter.acquire(f"rate_limit:{request.client.host}", limit, interval)
+            headers = _headers(limit, decision)
+            if not decision.allowed:
+                headers['Retry-After'] = str(math.ceil(decision.retry_after))
+                raise HTTPException(status_code=HTTPStatus.TOO_MANY_REQUESTS, detail="Too many requests",
+                                    headers=headers)
+            request.state.rate_limit_headers = headers
 
             return await func(request, *args, **kwargs)
 
         return wrapper
 
     return decorator
+
+
+class RateLimitHeadersMiddleware:
+    """Добавляет X-RateLimit-* к успешным ответам: обработчик возвращает модель, а не Response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                headers = scope.get('state', {}).get('rate_limit_headers')
+                if headers:
+                    message['headers'] = [
+                        *message.get('headers', []),
+                        *((name.lower().encode(), value.encode()) for name, value in headers.items()),
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
@@ -3,27 +3,69 @@ from contextlib import asynccontextmanager
 import uvicorn
 from async_fastapi_jwt_auth import AuthJWT
 from async_fastapi_jwt_auth.exceptions import AuthJWTException
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, Request
 from fastapi.responses import ORJSONResponse
-from opentelemetry import trace
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from redis.asyncio import Redis
 from starlette.responses import JSONResponse
 
-from api.v1 import auth, profile, user_role, roles, oauth
+from api.v1 import auth, profile, user_role, roles, oauth, sessions, stats, check
+from api.v1 import metrics as metrics_api
+from core import metrics
 from core.config import settings, JWTSettings
 from core.logger import LOGGING
+from core.request_id import RequestIdMiddleware
 from core.tracing import configure_tracer
-from db import redis
+from db import redis, login_history, revocation, role_registry, profile_cache
+from limiter import RateLimitHeadersMiddleware
+from utils import hashing
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
 
-    redis.redis = Redis(host=settings.redis.host, port=settings.redis.port)
+    redis.redis = redis.create_redis(settings.redis)
+    hashing.password_hasher = hashing.PasswordHasher(workers=settings.hashing.workers,
+                                                     queue_size=settings.hashing.queue_size)
+    if settings.login_history.mode == 'redis':
+        login_history.login_history_writer = login_history.RedisLoginHistoryWriter(
+            redis=redis.redis,
+            stream=settings.login_history.stream,
+            batch_size=settings.login_history.batch_size,
+            flush_interval=settings.login_history.flush_interval,
+        )
+    else:
+        login_history.login_history_writer = login_history.LoginHistoryWriter(
+            batch_size=settings.login_history.batch_size,
+            flush_interval=settings.login_history.flush_interval,
+            max_pending=settings.login_history.max_pending,
+            put_timeout=settings.login_history.put_timeout,
+        )
+    await login_history.login_history_writer.start()
+    revocation.revocation_filter = revocation.RevocationFilter(
+        redis=redis.redis,
+        stream=settings.revocation.stream,
+        capacity=settings.revocation.capacity,
+        error_rate=settings.revocation.error_rate,
+        retention=settings.revocation.retention,
+    )
+    await revocation.revocation_filter.start()
+    role_registry.role_registry = role_registry.RoleRegistry(redis=redis.redis,
+                                                             poll_interval=settings.role_registry.poll_interval)
+    await role_registry.role_registry.start()
+    profile_cache.profile_cache = profile_cache.ProfileCache(redis=redis.redis,
+                                                             ttl=settings.profile_cache.ttl,
+                                                             jitter=settings.profile_cache.jitter)
+    metrics.exporter = metrics.MetricsExporter(directory=settings.metrics.directory,
+                                               interval=settings.metrics.export_interval)
+    await metrics.exporter.start()
 
     yield
 
+    await metrics.exporter.close()
+    await role_registry.role_registry.close()
+    await revocation.revocation_filter.close()
+    await login_history.login_history_writer.close()
+    hashing.password_hasher.close()
     await redis.redis.close()
 
 
@@ -39,11 +81,19 @@ app = FastAPI(
 )
 
 
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(RequestIdMiddleware, tracing=settings.tracing.enable_tracer, exempt=('/metrics',))
+
 app.include_router(auth.router, prefix='/api/v1', tags=['auth'])
 app.include_router(profile.router, prefix='/api/v1', tags=['profile'])
 app.include_router(roles.router, prefix='/api/v1', tags=['roles'])
 app.include_router(user_role.router, prefix='/api/v1', tags=['user_role'])
 app.include_router(oauth.router, prefix='/api/v1', tags=['oauth'])
+app.include_router(sessions.router, prefix='/api/v1', tags=['sessions'])
+app.include_router(stats.router, prefix='/api/v1', tags=['stats'])
+app.include_router(check.router, prefix='/api/v1', tags=['check'])
+# Вне /api/: nginx метрики наружу не отдаёт, Prometheus ходит в сервис напрямую
+app.include_router(metrics_api.router, tags=['metrics'])
 
 
 @AuthJWT.load_config
@@ -51,23 +101,6 @@ def get_config():
     return JWTSettings()
 
 
-@app.middleware('http')
-async def add_request_id_tag(request: Request, call_next):
-    tracer = trace.get_tracer(__name__)
-    with tracer.start_as_current_span("request_id_middleware") as span:
-        span.set_attribute('http.request_id', request.headers.get('X-Request-Id'))
-        response = await call_next(request)
-    return response
-
-
-@app.middleware('http')
-async def before_request(request: Request, call_next):
-    response = await call_next(request)
-    request_id = request.headers.get('X-Request-Id')
-    if not request_id:
-        return ORJSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={'detail': 'X-Request-Id is required'})
-    return response
-
 if settings.tracing.enable_tracer:
     configure_tracer()
     FastAPIInstrumentor.instrument_app(app)
@@ -0,0 +1,48 @@
+"""login_stats counters and users.last_login_at
+
+Revision ID: a7c9e1f3b5d8
+Revises: f6b8d0e2a4c7
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c9e1f3b5d8'
+down_revision: Union[str, None] = 'f6b8d0e2a4c7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'login_stats',
+        sa.Column('user_id', sa.UUID(), nullable=False),
+        sa.Column('user_device_type', sa.String(length=255), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.Column('last_login_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'user_device_type', 'day'),
+    )
+    op.create_index('ix_login_stats_day', 'login_stats', ['day'])
+    op.add_column('users', sa.Column('last_login_at', sa.DateTime(), nullable=True))
+
+    # Разовый пересчёт по уже накопленной истории, дальше счётчики ведёт писатель истории
+    op.execute('INSERT INTO login_stats (user_id, user_device_type, day, count, last_login_at) '
+               'SELECT user_id, user_device_type, auth_date::date, count(*), max(auth_date) '
+               'FROM login_histories WHERE user_id IS NOT NULL '
+               'GROUP BY user_id, user_device_type, auth_date::date')
+    op.execute('UPDATE users SET last_login_at = stats.last_login_at '
+               'FROM (SELECT user_id, max(last_login_at) AS last_login_at FROM login_stats GROUP BY user_id) stats '
+               'WHERE users.id = stats.user_id')
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'last_login_at')
+    op.drop_index('ix_login_stats_day', table_name='login_stats')
+    op.drop_table('login_stats')
@@ -0,0 +1,26 @@
+"""tokens user_id, user_agent index
+
+Revision ID: b2d4f6a8c1e3
+Revises: 6bef53ff86c9
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2d4f6a8c1e3'
+down_revision: Union[str, None] = '6bef53ff86c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_tokens_user_id_user_agent', 'tokens', ['user_id', 'user_agent'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tokens_user_id_user_agent', table_name='tokens')
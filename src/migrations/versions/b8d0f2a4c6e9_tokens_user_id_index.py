@@ -0,0 +1,30 @@
+"""tokens user_id index instead of user_id, user_agent
+
+Revision ID: b8d0f2a4c6e9
+Revises: a7c9e1f3b5d8
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d0f2a4c6e9'
+down_revision: Union[str, None] = 'a7c9e1f3b5d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Refresh ищет сессию по уникальному refresh_token_hash, user_agent в индексе не нужен;
+    # по user_id удаляются все токены при выходе со всех устройств
+    op.drop_index('ix_tokens_user_id_user_agent', table_name='tokens')
+    op.create_index('ix_tokens_user_id', 'tokens', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tokens_user_id', table_name='tokens')
+    op.create_index('ix_tokens_user_id_user_agent', 'tokens', ['user_id', 'user_agent'], unique=False)
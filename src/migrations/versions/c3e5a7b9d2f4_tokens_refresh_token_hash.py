@@ -0,0 +1,34 @@
+"""tokens refresh_token_hash
+
+Revision ID: c3e5a7b9d2f4
+Revises: b2d4f6a8c1e3
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e5a7b9d2f4'
+down_revision: Union[str, None] = 'b2d4f6a8c1e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tokens', sa.Column('refresh_token_hash', sa.LargeBinary(length=32), nullable=True))
+    op.execute("UPDATE tokens SET refresh_token_hash = sha256(convert_to(refresh_token, 'UTF8')) "
+               "WHERE refresh_token IS NOT NULL")
+    op.create_unique_constraint('tokens_refresh_token_hash_key', 'tokens', ['refresh_token_hash'])
+    op.drop_column('tokens', 'refresh_token')
+
+
+def downgrade() -> None:
+    # Из хэша токен не восстановить: после отката все сессии придётся открыть заново
+    op.execute('DELETE FROM tokens')
+    op.add_column('tokens', sa.Column('refresh_token', sa.String(length=500), nullable=True))
+    op.create_unique_constraint('tokens_refresh_token_key', 'tokens', ['refresh_token'])
+    op.drop_column('tokens', 'refresh_token_hash')
@@ -0,0 +1,26 @@
+"""users tokens_valid_after
+
+Revision ID: d4f6b8c0e3a5
+Revises: c3e5a7b9d2f4
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f6b8c0e3a5'
+down_revision: Union[str, None] = 'c3e5a7b9d2f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('tokens_valid_after', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'tokens_valid_after')
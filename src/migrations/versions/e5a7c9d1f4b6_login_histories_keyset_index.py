@@ -0,0 +1,28 @@
+"""login_histories user_id, auth_date index
+
+Revision ID: e5a7c9d1f4b6
+Revises: d4f6b8c0e3a5
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c9d1f4b6'
+down_revision: Union[str, None] = 'd4f6b8c0e3a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индекс на секционированной таблице создаётся на каждой партиции
+    op.execute('CREATE INDEX ix_login_histories_user_id_auth_date '
+               'ON login_histories (user_id, auth_date DESC, id DESC)')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_login_histories_user_id_auth_date', table_name='login_histories')
@@ -0,0 +1,106 @@
+"""login_histories monthly sub-partitions
+
+Revision ID: f6b8d0e2a4c7
+Revises: e5a7c9d1f4b6
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b8d0e2a4c7'
+down_revision: Union[str, None] = 'e5a7c9d1f4b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DEVICE_PARTITIONS = {
+    'smart_tv': 'login_histories_smart',
+    'mobile': 'login_histories_mobile',
+    'desktop': 'login_histories_desktop',
+}
+MONTHS_AHEAD = 3
+COLUMNS = 'id, user_agent, user_device_type, auth_date, created_at, modified_at, user_id'
+
+
+def month_start(day: date, shift: int = 0) -> date:
+    months = day.year * 12 + day.month - 1 + shift
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def rename_current_tables() -> None:
+    # Имена индексов общие на схему, поэтому старые индексы тоже переименовываются
+    op.execute('ALTER SEQUENCE login_histories_id_seq OWNED BY NONE')
+    op.execute('ALTER TABLE login_histories RENAME TO login_histories_old')
+    op.execute('ALTER TABLE login_histories_old RENAME CONSTRAINT login_histories_pkey TO login_histories_old_pkey')
+    op.execute('ALTER INDEX ix_login_histories_user_id_auth_date RENAME TO ix_login_histories_old_user_id_auth_date')
+    for table in DEVICE_PARTITIONS.values():
+        op.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+
+
+def finish(copy_auth_date: str) -> None:
+    op.execute(f'INSERT INTO login_histories ({COLUMNS}) '
+               f"SELECT {COLUMNS.replace('auth_date', copy_auth_date)} FROM login_histories_old "
+               f'WHERE user_device_type IS NOT NULL')
+    op.execute('DROP TABLE login_histories_old CASCADE')
+    op.execute('ALTER SEQUENCE login_histories_id_seq OWNED BY login_histories.id')
+    op.execute('CREATE INDEX ix_login_histories_user_id_auth_date '
+               'ON login_histories (user_id, auth_date DESC, id DESC)')
+
+
+def upgrade() -> None:
+    first = op.get_bind().execute(sa.text('SELECT min(coalesce(auth_date, created_at)) FROM login_histories')).scalar()
+    today = date.today()
+    start = month_start(first.date()) if first else month_start(today)
+
+    rename_current_tables()
+    op.execute("""
+        CREATE TABLE login_histories (
+            id integer NOT NULL DEFAULT nextval('login_histories_id_seq'),
+            user_agent varchar(255),
+            user_device_type varchar(255) NOT NULL,
+            auth_date timestamp NOT NULL,
+            created_at timestamp,
+            modified_at timestamp,
+            user_id uuid REFERENCES users (id) ON DELETE CASCADE,
+            CONSTRAINT login_histories_pkey PRIMARY KEY (id, user_device_type, auth_date)
+        ) PARTITION BY LIST (user_device_type)
+    """)
+    for device, table in DEVICE_PARTITIONS.items():
+        op.execute(f"CREATE TABLE {table} PARTITION OF login_histories FOR VALUES IN ('{device}') "
+                   f'PARTITION BY RANGE (auth_date)')
+        op.execute(f'CREATE TABLE {table}_default PARTITION OF {table} DEFAULT')
+        month = start
+        while month <= month_start(today, MONTHS_AHEAD):
+            op.execute(f"CREATE TABLE {table}_{month:%Y_%m} PARTITION OF {table} "
+                       f"FOR VALUES FROM ('{month}') TO ('{month_start(month, 1)}')")
+            month = month_start(month, 1)
+
+    finish('coalesce(auth_date, created_at, now())')
+    # BRIN по времени входа: крошечный индекс для выборок по диапазону дат
+    op.execute('CREATE INDEX ix_login_histories_auth_date_brin ON login_histories USING brin (auth_date)')
+
+
+def downgrade() -> None:
+    op.execute('DROP INDEX ix_login_histories_auth_date_brin')
+    rename_current_tables()
+    op.execute("""
+        CREATE TABLE login_histories (
+            id integer NOT NULL DEFAULT nextval('login_histories_id_seq'),
+            user_agent varchar(255),
+            user_device_type varchar(255) NOT NULL,
+            auth_date timestamp,
+            created_at timestamp,
+            modified_at timestamp,
+            user_id uuid REFERENCES users (id) ON DELETE CASCADE,
+            CONSTRAINT login_histories_pkey PRIMARY KEY (id, user_device_type),
+            UNIQUE (id, user_device_type)
+        ) PARTITION BY LIST (user_device_type)
+    """)
+    for device, table in DEVICE_PARTITIONS.items():
+        op.execute(f"CREATE TABLE {table} PARTITION OF login_histories FOR VALUES IN ('{device}')")
+    finish('auth_date')
@@ -1,3 +1,5 @@
+from uuid import UUID
+
 from pydantic import BaseModel
 from models.users import UserProfileResult
 
@@ -54,5 +56,15 @@ class UserRole(BaseModel):
     role: RoleInDB
 
 
+class UserRolesRequest(BaseModel):
+    user_ids: list[UUID]
+
+
+class UserRolesMap(BaseModel):
+    # Роль каждого найденного пользователя (None, если не назначена); сами роли не дублируются
+    users: dict[UUID, int | None]
+    roles: dict[int, RoleInDB]
+
+
 class RoleError(BaseModel):
     detail: str | None
@@ -2,15 +2,16 @@ import uuid
 from datetime import datetime
 
 from fastapi import HTTPException
-from sqlalchemy import Boolean, Column, DateTime, String, Integer, ForeignKey, Date, UniqueConstraint
+from sqlalchemy import (Boolean, Column, DateTime, String, Integer, ForeignKey, Date, Index,
+                        LargeBinary)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from starlette import status
-from werkzeug.security import check_password_hash, generate_password_hash
 
 from python_usernames import is_safe_username
 
 from db.postgres import Base
+from utils import hashing
 from utils.validators import validate_login, validate_email, validate_password
 
 
@@ -42,6 +43,9 @@ class User(Base):
                                  cascade='all, delete',
                                  passive_deletes=True)
     is_active = Column(Boolean, default=False)
+    # Токены, выпущенные не позже этого момента, недействительны (выход со всех устройств)
+    tokens_valid_after = Column(DateTime, nullable=True)
+    last_login_at = Column(DateTime, nullable=True)
     social_network = relationship('SocialNetwork', back_populates='user')
 
     def __init__(self, username: str, login: str, password: str, birth_day: str | None, email: str, *args, **kwargs):
@@ -59,15 +63,17 @@ class User(Base):
 
         self.username = username
         self.login = login
-        self.password = self.password = generate_password_hash(password)
         self.email = email
         if birth_day is not None:
             self.birth_day = datetime.fromisoformat(birth_day)
         for key, value in kwargs.items():
             setattr(self, key, value)
 
-    def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password, password)
+    async def set_password(self, password: str) -> None:
+        self.password = await hashing.password_hasher.hash(password)
+
+    async def check_password(self, password: str) -> bool:
+        return await hashing.password_hasher.verify(self.password, password)
 
     def __repr__(self) -> str:
         return f'<User {self.login}>'
@@ -90,9 +96,13 @@ class Role(Base):
 
 class Token(Base):
     __tablename__ = 'tokens'
+    __table_args__ = (
+        # Выход со всех устройств удаляет токены по user_id; refresh ищет по refresh_token_hash
+        Index('ix_tokens_user_id', 'user_id'),
+    )
 
     id = Column(Integer, primary_key=True, unique=True, nullable=False, autoincrement=True)
-    refresh_token = Column(String(500), unique=True)
+    refresh_token_hash = Column(LargeBinary(32), unique=True)
     user_agent = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
     modified_at = Column(DateTime, default=datetime.utcnow)
@@ -111,19 +121,20 @@ def get_device_type(user_agent):
 
 class LoginHistory(Base):
     __tablename__ = 'login_histories'
+    # Партиции по типу устройства, внутри каждой — помесячные по auth_date (см. db/partitions.py),
+    # поэтому обе колонки входят в первичный ключ
     __table_args__ = (
-        UniqueConstraint('id', 'user_device_type'),
         {
             'postgresql_partition_by': 'LIST (user_device_type)'
-        }
+        },
     )
 
-    id = Column(Integer, primary_key=True, unique=True, nullable=False, autoincrement=True)
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
     user_agent = Column(String(255))
-    auth_date = Column(DateTime, default=datetime.utcnow)
+    auth_date = Column(DateTime, primary_key=True, nullable=False, default=datetime.utcnow)
     created_at = Column(DateTime, default=datetime.utcnow)
     modified_at = Column(DateTime, default=datetime.utcnow)
-    user_device_type = Column(String(255), nullable=False)
+    user_device_type = Column(String(255), primary_key=True, nullable=False)
     user_id = Column(ForeignKey('users.id', ondelete='CASCADE'))
     user = relationship('User', back_populates='login_history')
 
@@ -135,6 +146,26 @@ class LoginHistory(Base):
             setattr(self, key, value)
 
 
+# Постраничная история входов по ключу (auth_date, id): индекс создаётся на каждой партиции
+Index('ix_login_histories_user_id_auth_date', LoginHistory.user_id, LoginHistory.auth_date.desc(),
+      LoginHistory.id.desc())
+
+
+class LoginStat(Base):
+    """Число входов пользователя по типу устройства за день, обновляется вместе с записью истории."""
+
+    __tablename__ = 'login_stats'
+    __table_args__ = (
+        Index('ix_login_stats_day', 'day'),
+    )
+
+    user_id = Column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    user_device_type = Column(String(255), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    last_login_at = Column(DateTime, nullable=False)
+
+
 class SocialNetwork(Base):
     __tablename__ = 'social_network'
     id = Column(Integer, primary_key=True, unique=True, nullable=False, autoincrement=True)
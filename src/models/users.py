@@ -104,7 +104,18 @@ class Paginator(BaseModel, Generic[T]):
     page: int
     limit: int
     results: List[T]
+    next_cursor: str | None = None
 
 
 class UserMessageOut(BaseModel):
-    message: str = ''
\ No newline at end of file
+    message: str = ''
+
+class LoginStatsDay(BaseModel):
+    day: date
+    user_device_type: str
+    count: int
+
+
+class UserLoginStats(BaseModel):
+    last_login_at: datetime | None = None
+    days: List[LoginStatsDay]
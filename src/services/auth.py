@@ -1,22 +1,24 @@
-import time
 from functools import lru_cache
 from http import HTTPStatus
 
 from async_fastapi_jwt_auth import AuthJWT
 from fastapi import Depends, Request, HTTPException
 from fastapi.encoders import jsonable_encoder
-from redis.asyncio import Redis
-from sqlalchemy import select
+from sqlalchemy import Row, delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import NoResultFound, IntegrityError
-from werkzeug.security import check_password_hash
+from sqlalchemy.exc import IntegrityError
 
+from db.login_history import LoginHistoryWriter, get_login_history_writer
 from db.postgres import get_session
-from db.redis import get_redis
-from models.schemas import User, Role, LoginHistory, Token
+from db.revocation import RevocationFilter, get_revocation_filter
+from models.schemas import User, Role, Token
 from models.users import UserCreate, UserLogin, UserSuccessLogin
 from services.abstract import AbstractService, DeleteAbstractService
 from services.common.access_check_common import AccessCheckCommon
+from services.common.permissions import role_claims
+from services.sessions import revoke_all_sessions
+from services.common.auth_context import AuthContext, REFRESH_COOKIE, decode_token, get_auth_context, issued_at_claims
+from utils.hashing import PasswordHasher, get_password_hasher, token_digest
 
 
 class SignUpService(AbstractService):
@@ -26,6 +28,7 @@ class SignUpService(AbstractService):
     async def get_data(self, user_create: UserCreate):
         try:
             user = User(**jsonable_encoder(user_create))
+            await user.set_password(user_create.password)
             result = await self._db.execute(select(Role).where(
                 Role.is_admin == False,
                 Role.is_subscriber == False,
@@ -35,21 +38,18 @@ class SignUpService(AbstractService):
             role = result.fetchone()
 
             if role is None:
-                role = Role(name="Base user",
-                            description="Base user role",
-                            is_admin=False,
-                            is_superuser=False,
-                            is_subscriber=False,
-                            is_manager=False)
-                self._db.add(role)
-                await self._db.commit()
-                await self._db.refresh(role)
-
-                user.role_id = role.id
-                await self.db_add_user(user)
+                # Роль и пользователь уходят одним flush, id роли подставится через relationship
+                user.role = Role(name="Base user",
+                                 description="Base user role",
+                                 is_admin=False,
+                                 is_superuser=False,
+                                 is_subscriber=False,
+                                 is_manager=False)
             else:
                 user.role_id = role[0].id
-                await self.db_add_user(user)
+            self._db.add(user)
+            # flush здесь, чтобы нарушение уникальности превратилось в 409, коммит сделает маршрут
+            await self._db.flush()
 
             return user
         except IntegrityError as e:
@@ -61,114 +61,95 @@ class SignUpService(AbstractService):
             elif 'Key (login)=' in error_message:
                 raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='Login already exists')
 
-    async def db_add_user(self, user):
-        self._db.add(user)
-        await self._db.commit()
-        await self._db.refresh(user)
-
 
 class LoginService(AbstractService):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT):
+    def __init__(self, db: AsyncSession, authorize: AuthJWT, hasher: PasswordHasher,
+                 history_writer: LoginHistoryWriter):
         self._db = db
         self._authorize = authorize
+        self._hasher = hasher
+        self._history_writer = history_writer
 
     async def get_data(self, user: UserLogin, user_agent: str):
         user_found = await self.get_by_login(user.login)
         if not user_found:
             raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="User not found")
-        if await self.check_password(user):
-            refresh_token = await self._authorize.create_refresh_token(subject=str(user_found.id))
-            access_token = await self._authorize.create_access_token(subject=str(user_found.id),
-                                                                     user_claims={'role_id': user_found.role_id})
+        if await self.check_password(user_found.password, user.password):
+            issued = issued_at_claims()
+            refresh_token = await self._authorize.create_refresh_token(subject=str(user_found.id), user_claims=issued)
+            access_token = await self._authorize.create_access_token(
+                subject=str(user_found.id),
+                user_claims={**await role_claims(self._db, user_found.role_id), **issued}
+            )
 
             await self._authorize.set_access_cookies(access_token)
             await self._authorize.set_refresh_cookies(refresh_token)
 
-            await self.set_by_login_history(user_id=user_found.id, user_agent=user_agent)
-            await self.set_refresh_token(user_id=user_found.id, user_agent=user_agent,
-                                         refresh_token=refresh_token)
+            self._db.add(Token(user_id=user_found.id, user_agent=user_agent,
+                               refresh_token_hash=token_digest(refresh_token)))
+            await self._history_writer.add(user_id=user_found.id, user_agent=user_agent)
 
             if not refresh_token and not access_token:
                 raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail="Login error")
         else:
             raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Password error')
 
-    async def get_by_login(self, login: str) -> User | None:
+    async def get_by_login(self, login: str) -> Row | None:
+        """Достаёт только нужные для входа колонки одним запросом."""
         result = await self._db.execute(
-            select(User).where(User.login == login)
+            select(User.id, User.password, User.role_id).where(User.login == login)
         )
-        user = result.scalars().first()
-        return user if user else None
-
-    async def check_password(self, user: UserLogin) -> bool:
-        result = await self._db.execute(
-            select(User.password).where(User.login == user.login)
-        )
-        password_hash = result.scalars().first()
-        result = check_password_hash(password_hash, user.password)
-        return bool(result)
-
-    async def set_by_login_history(self, user_id: str, user_agent: str):
-        history = LoginHistory(user_id=user_id, user_agent=user_agent)
-        self._db.add(history)
-        await self._db.commit()
+        return result.first()
 
-    async def set_refresh_token(self, user_id: str, user_agent: str, refresh_token: str):
-        token = Token(user_id=user_id, user_agent=user_agent, refresh_token=refresh_token)
-        self._db.add(token)
-        await self._db.commit()
+    async def check_password(self, password_hash: str, password: str) -> bool:
+        return await self._hasher.verify(password_hash, password)
 
 
 class LogoutService(DeleteAbstractService, AccessCheckCommon):
     def __init__(self, authorize: AuthJWT,
-                 redis_token: Redis,
+                 auth: AuthContext,
+                 revocation: RevocationFilter,
                  db: AsyncSession):
         self._authorize = authorize
-        self._redis_token = redis_token
+        self._auth = auth
+        self._revocation = revocation
         self._db = db
 
-    async def delete(self, request: Request):
-        await self._authorize.jwt_required()
+    async def delete(self, request: Request, full_logout: bool = False):
+        jwt_subject = self._auth.subject
 
-        jwt_subject = await self._authorize.get_jwt_subject()
+        refresh = await decode_token(self._authorize, request.cookies.get(REFRESH_COOKIE), REFRESH_COOKIE, 'refresh')
 
-        access_token = request.cookies.get('access_token_cookie')
-        refresh_token = request.cookies.get('refresh_token_cookie')
+        access_jti = self._auth.jti
+        refresh_jti = refresh.jti
 
-        refresh_jti = await self._authorize.get_jti(refresh_token)
-        access_jti = await self._authorize.get_jti(access_token)
+        # После full logout с другого устройства токены этой сессии уже недействительны
+        if (await self._revocation.issued_before_epoch(jwt_subject, self._auth.iat_ms)
+                or await self._revocation.issued_before_epoch(jwt_subject, refresh.iat_ms)):
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Please login again")
 
-        if await self._redis_token.exists(access_jti) or await self._redis_token.exists(refresh_jti):
+        if not await self._revocation.revoke(jwt_subject, (access_jti, self._auth.exp), (refresh_jti, refresh.exp)):
             raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail="Access and refresh tokens are invalid")
 
         await self._authorize.unset_jwt_cookies()
-
-        access_token_exp = (await self._authorize.get_raw_jwt(access_token))["exp"]
-        refresh_token_exp = (await self._authorize.get_raw_jwt(refresh_token))["exp"]
-            
-        access_token_ttl = access_token_exp - int(time.time())
-        refresh_token_ttl = refresh_token_exp - int(time.time())
-
-        await self._redis_token.set(name=access_jti, value=jwt_subject, ex=access_token_ttl)
-        await self._redis_token.set(name=refresh_jti, value=jwt_subject, ex=refresh_token_ttl)
-        await self.delete_refresh_token_from_db(refresh_token)
+        if full_logout:
+            await revoke_all_sessions(self._db, self._revocation, jwt_subject)
+        else:
+            await self.delete_refresh_token_from_db(refresh.token)
 
     async def delete_refresh_token_from_db(self, refresh_token: str):
-        token_to_delete = await self._db.execute(select(Token).where(Token.refresh_token == refresh_token))
-        token = token_to_delete.fetchone()
-        if token:
-            await self._db.delete(token[0])
-            await self._db.commit()
-        else:
-            raise NoResultFound("Token not found")
+        # Строки уже может не быть (сессии удалены full logout): выход всё равно считается выполненным
+        await self._db.execute(delete(Token).where(Token.refresh_token_hash == token_digest(refresh_token)))
 
 
 @lru_cache()
 def get_login_service(
         db: AsyncSession = Depends(get_session),
         authorize: AuthJWT = Depends(),
+        hasher: PasswordHasher = Depends(get_password_hasher),
+        history_writer: LoginHistoryWriter = Depends(get_login_history_writer),
 ) -> LoginService:
-    return LoginService(db, authorize)
+    return LoginService(db, authorize, hasher, history_writer)
 
 
 @lru_cache()
@@ -181,7 +162,8 @@ def get_sign_up_service(
 @lru_cache()
 def get_logout_service(
         authorize: AuthJWT = Depends(),
-        redis_token: Redis = Depends(get_redis),
+        auth: AuthContext = Depends(get_auth_context),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
         db: AsyncSession = Depends(get_session)
 ) -> LogoutService:
-    return LogoutService(authorize, redis_token, db)
+    return LogoutService(authorize, auth, revocation, db)
@@ -0,0 +1,71 @@
+from http import HTTPStatus
+
+from async_fastapi_jwt_auth import AuthJWT
+from async_fastapi_jwt_auth.exceptions import AuthJWTException
+from fastapi import Depends, HTTPException
+from starlette.requests import Request
+
+from db.revocation import RevocationFilter, get_revocation_filter
+from services.abstract import AbstractService
+from services.common.access_check_common import AccessCheckCommon
+from services.common.auth_context import ACCESS_COOKIE, AuthContext, decode_token
+from services.common.permissions import ANONYMOUS, Permission
+from services.common.roles_common import RolesCommon
+
+
+class PermissionCheckService(AbstractService, RolesCommon, AccessCheckCommon):
+    """Разрешение для auth_request шлюза только по claims и фильтру отзыва, без Postgres.
+
+    Токен берётся из cookie или заголовка Authorization: Bearer. Запрос без токена
+    получает права ANONYMOUS и проходит, если required их не превышает.
+    """
+
+    def __init__(self, authorize: AuthJWT, revocation: RevocationFilter):
+        self._authorize = authorize
+        self._revocation = revocation
+        self._auth: AuthContext | None = None
+
+    @staticmethod
+    def parse_required(names: str | None) -> Permission:
+        required = Permission(0)
+        for name in filter(None, (names or '').split(',')):
+            try:
+                required |= Permission[name.strip().upper()]
+            except KeyError:
+                raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f"Unknown permission {name}")
+        return required
+
+    @staticmethod
+    def get_token(request: Request) -> str | None:
+        scheme, _, token = request.headers.get('authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and token:
+            return token
+        return request.cookies.get(ACCESS_COOKIE)
+
+    async def get_data(self, request: Request, required: Permission) -> dict[str, str]:
+        token = self.get_token(request)
+        if not token:
+            if required and not ANONYMOUS & required:
+                raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Authentication required")
+            return {'X-User-Permissions': str(int(ANONYMOUS))}
+
+        try:
+            self._auth = await decode_token(self._authorize, token, ACCESS_COOKIE, 'access')
+        except AuthJWTException as exc:
+            # auth_request понимает только 401 и 403, остальные коды nginx превращает в 500
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail=exc.message)
+        await self.check_access()
+        await self.check_auth(required)
+        return {
+            'X-User-Id': str(self._auth.subject),
+            'X-User-Role': '' if self._auth.role_id is None else str(self._auth.role_id),
+            'X-User-Permissions': str(self._auth.permissions),
+        }
+
+
+# Асинхронная фабрика без Depends(AuthJWT): синхронные зависимости FastAPI гоняет через пул потоков,
+# а на этом эндпоинте переход в поток дороже самой проверки
+async def get_permission_check_service(
+        revocation: RevocationFilter = Depends(get_revocation_filter),
+) -> PermissionCheckService:
+    return PermissionCheckService(AuthJWT(), revocation)
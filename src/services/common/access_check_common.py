@@ -5,15 +5,15 @@ from redis.exceptions import ResponseError
 
 
 class AccessCheckCommon:
-    _authorize = None
+    _auth = None
     _redis_token = None
+    # RevocationFilter, который сервис получает через Depends(get_revocation_filter)
+    _revocation = None
 
     async def check_access(self):
-        await self._authorize.jwt_required()
-        raw_token = await self._authorize.get_raw_jwt()
-        access_jti = (raw_token)["jti"]
         try:
-            if await self._redis_token.exists(access_jti):
+            if (await self._revocation.is_revoked(self._auth.jti)
+                    or await self._revocation.issued_before_epoch(self._auth.subject, self._auth.iat_ms)):
                 raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail="Access token is invalid or expired")
         except ResponseError:
             raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR, detail="Error connecting to Redis")
@@ -0,0 +1,53 @@
+import time
+
+from async_fastapi_jwt_auth import AuthJWT
+from async_fastapi_jwt_auth.exceptions import AccessTokenRequired, MissingTokenError, RefreshTokenRequired
+from fastapi import Depends, Request
+
+ACCESS_COOKIE = 'access_token_cookie'
+REFRESH_COOKIE = 'refresh_token_cookie'
+
+
+def issued_at_claims() -> dict:
+    """Время выпуска в миллисекундах: iat в секундах не отличает новый вход от full logout в ту же секунду."""
+    return {'iat_ms': time.time_ns() // 1_000_000}
+
+
+class AuthContext:
+    """Проверенные один раз claims токена, общие для всех сервисов запроса."""
+
+    __slots__ = ('token', 'claims', 'subject', 'jti', 'role_id', 'permissions', 'role_version', 'iat_ms', 'exp')
+
+    def __init__(self, token: str, claims: dict):
+        self.token = token
+        self.claims = claims
+        self.subject = claims['sub']
+        self.jti = claims['jti']
+        self.role_id = claims.get('role_id')
+        self.permissions = claims.get('perms', 0)
+        self.role_version = claims.get('role_ver')
+        # Токены, выпущенные до появления iat_ms, считаются выпущенными в начале своей секунды
+        self.iat_ms = claims.get('iat_ms', claims['iat'] * 1000)
+        self.exp = claims['exp']
+
+
+async def decode_token(authorize: AuthJWT, token: str | None, cookie: str, token_type: str) -> AuthContext:
+    if not token:
+        raise MissingTokenError(status_code=401, message=f'Missing cookie {cookie}')
+    claims = await authorize.get_raw_jwt(token)
+    if claims['type'] != token_type:
+        message = f'Only {token_type} tokens are allowed'
+        if token_type == 'access':
+            raise AccessTokenRequired(status_code=422, message=message)
+        raise RefreshTokenRequired(status_code=422, message=message)
+    return AuthContext(token, claims)
+
+
+# FastAPI кэширует зависимости в пределах запроса, поэтому подпись токена проверяется один раз,
+# сколько бы сервисов его ни запросили
+async def get_auth_context(request: Request, authorize: AuthJWT = Depends()) -> AuthContext:
+    return await decode_token(authorize, request.cookies.get(ACCESS_COOKIE), ACCESS_COOKIE, 'access')
+
+
+async def get_refresh_context(request: Request, authorize: AuthJWT = Depends()) -> AuthContext:
+    return await decode_token(authorize, request.cookies.get(REFRESH_COOKIE), REFRESH_COOKIE, 'refresh')
@@ -0,0 +1,49 @@
+from enum import IntFlag
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import role_registry
+from models.schemas import Role
+
+
+class Permission(IntFlag):
+    SUBSCRIBER = 1
+    SUPERUSER = 2
+    MANAGER = 4
+    ADMIN = 8
+
+
+# Кому доступно управление ролями
+ROLE_MANAGEMENT = Permission.ADMIN | Permission.MANAGER | Permission.SUPERUSER
+# Кому доступен принудительный выход пользователя со всех устройств
+SESSION_MANAGEMENT = Permission.ADMIN | Permission.SUPERUSER
+# Права запроса без токена
+ANONYMOUS = Permission(0)
+
+
+def role_permissions(role) -> Permission:
+    permissions = Permission(0)
+    if role is None:
+        return permissions
+    if role.is_subscriber:
+        permissions |= Permission.SUBSCRIBER
+    if role.is_superuser:
+        permissions |= Permission.SUPERUSER
+    if role.is_manager:
+        permissions |= Permission.MANAGER
+    if role.is_admin:
+        permissions |= Permission.ADMIN
+    return permissions
+
+
+async def role_claims(db: AsyncSession, role_id: int | None) -> dict:
+    """Claims access-токена, по которым права проверяются без обращения к базе."""
+    registry = role_registry.role_registry
+    role = registry.get(role_id) if role_id is not None else None
+    if role is None and role_id is not None:
+        role = await db.get(Role, role_id)
+    return {
+        'role_id': role_id,
+        'perms': int(role_permissions(role)),
+        'role_ver': registry.role_version(role_id),
+    }
@@ -2,19 +2,25 @@ from http import HTTPStatus
 
 from fastapi import HTTPException
 
+from db import role_registry
 from models.schemas import Role
+from services.common.permissions import ROLE_MANAGEMENT, Permission
 
 
 class RolesCommon:
-    _authorize = None
+    _auth = None
     _db = None
 
-    async def check_auth(self):
-        await self._authorize.jwt_required()
-
-        role_id = (await self._authorize.get_raw_jwt())["role_id"]
-
-        role = await self._db.get(Role, role_id)
-        if not (role.is_admin or role.is_manager or role.is_superuser):
+    async def check_auth(self, required: Permission = ROLE_MANAGEMENT):
+        # Права берутся из claims; версия роли отсекает токены, выданные до её изменения
+        if self._auth.role_version != role_registry.role_registry.role_version(self._auth.role_id):
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED,
+                                detail="Role permissions have changed, refresh tokens")
+        # Пустой набор означает «достаточно действующей роли»
+        if required and not self._auth.permissions & required:
             raise HTTPException(status_code=HTTPStatus.FORBIDDEN,
-                                detail="Only admins, moderators, and superusers can get all roles")
+                                detail="Not enough permissions")
+
+    async def get_role(self, role_id: int):
+        # Роль, созданная только что на другом воркере, могла ещё не доехать до реестра
+        return role_registry.role_registry.get(role_id) or await self._db.get(Role, role_id)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from functools import lru_cache
+from functools import lru_cache, partial
 from http import HTTPStatus
 
 import aiohttp
@@ -11,10 +11,16 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.config import settings
+from db.login_history import LoginHistoryWriter, get_login_history_writer
 from db.postgres import get_session
-from models.schemas import LoginHistory, Role, Token, User, SocialNetwork
+from db.profile_cache import ProfileCache, get_profile_cache
+from db.unit_of_work import after_commit
+from models.schemas import Role, Token, User, SocialNetwork
 from models.users import UserYandexCreate, SocialNetworkCreate
 from services.abstract import AbstractService
+from services.common.auth_context import issued_at_claims
+from services.common.permissions import role_claims
+from utils.hashing import token_digest
 from utils.helpers import generate_random_password
 
 AUTH_URL = "https://oauth.yandex.ru/authorize"
@@ -30,9 +36,12 @@ class YandexAuthServiceLogin(AbstractService):
 
 
 class YandexAuthServiceCallback(AbstractService):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT):
+    def __init__(self, db: AsyncSession, authorize: AuthJWT, history_writer: LoginHistoryWriter,
+                 cache: ProfileCache):
         self._db = db
         self._authorize = authorize
+        self._history_writer = history_writer
+        self._cache = cache
 
     async def get_data(self, code: str, user_agent: str):
         access_token = await self.get_user_token(code)
@@ -40,15 +49,14 @@ class YandexAuthServiceCallback(AbstractService):
             raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Failed to obtain access token")
         user_info = await self.get_user_info(access_token)
 
-        user_found = await self.get_user_by_yandex_email(user_info['default_email'])
-        if not user_found:
-            await self.create_user_for_db(user_info)
-            user = await self.get_user_by_yandex_email(user_info['default_email'])
+        user = await self.get_user_by_yandex_email(user_info['default_email'])
+        if not user:
+            user = await self.create_user_for_db(user_info)
             await self.social_network_for_db(user.id)
         else:
-            await self.user_update(user_found, user_info)
+            await self.user_update(user, user_info)
 
-        await self.authorize_user(user_info, user_agent)
+        await self.authorize_user(user, user_agent)
         return {"user_info": user_info}
 
     @staticmethod
@@ -84,6 +92,7 @@ class YandexAuthServiceCallback(AbstractService):
         return user_info
 
     async def create_user_for_db(self, user_info: dict):
+        password = generate_random_password()
         user_data = UserYandexCreate(
             username=user_info['login'],
             login=user_info['login'],
@@ -91,12 +100,13 @@ class YandexAuthServiceCallback(AbstractService):
             last_name=user_info["last_name"],
             email=user_info["default_email"],
             birth_day=datetime.strptime(user_info.get('birthday'), "%Y-%m-%d") if user_info.get('birthday') else None,
-            password=generate_random_password(),
+            password=password,
             picture=None,
             social_network_login=user_info["login"],
             is_verified_email=True
         )
         user = User(**jsonable_encoder(user_data))
+        await user.set_password(password)
         result = await self._db.execute(select(Role).where(
             Role.is_admin == False,
             Role.is_subscriber == False,
@@ -106,37 +116,27 @@ class YandexAuthServiceCallback(AbstractService):
         role = result.fetchone()
 
         if role is None:
-            role = Role(name="Base user",
-                        description="Base user role",
-                        is_admin=False,
-                        is_superuser=False,
-                        is_subscriber=False,
-                        is_manager=False)
-            self._db.add(role)
-            await self._db.commit()
-            await self._db.refresh(role)
-
-            user.role_id = role.id
-            await self.db_add_user(user)
+            user.role = Role(name="Base user",
+                             description="Base user role",
+                             is_admin=False,
+                             is_superuser=False,
+                             is_subscriber=False,
+                             is_manager=False)
         else:
             user.role_id = role[0].id
-            await self.db_add_user(user)
-
-        return user
-
-    async def db_add_user(self, user):
         self._db.add(user)
-        await self._db.commit()
-        await self._db.refresh(user)
+        # id пользователя нужен для social_network, поэтому роль и пользователь уходят в базу сразу
+        await self._db.flush()
 
-    async def authorize_user(self, user_info: dict, user_agent: str):
-        user_found = await self.get_user_by_yandex_email(user_info['default_email'])
-        if not user_found:
-            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='User not found')
+        return user
 
-        refresh_token = await self._authorize.create_refresh_token(subject=str(user_found.id))
-        access_token = await self._authorize.create_access_token(subject=str(user_found.id),
-                                                                 user_claims={'role_id': user_found.role_id})
+    async def authorize_user(self, user_found: User, user_agent: str):
+        issued = issued_at_claims()
+        refresh_token = await self._authorize.create_refresh_token(subject=str(user_found.id), user_claims=issued)
+        access_token = await self._authorize.create_access_token(
+            subject=str(user_found.id),
+            user_claims={**await role_claims(self._db, user_found.role_id), **issued}
+        )
 
         await self._authorize.set_access_cookies(access_token)
         await self._authorize.set_refresh_cookies(refresh_token)
@@ -153,21 +153,18 @@ class YandexAuthServiceCallback(AbstractService):
         return user if user else None
 
     async def set_by_login_history(self, user_id: str, user_agent: str):
-        history = LoginHistory(user_id=user_id, user_agent=user_agent)
-        self._db.add(history)
-        await self._db.commit()
+        await self._history_writer.add(user_id=user_id, user_agent=user_agent)
 
     async def set_refresh_token(self, user_id: str, user_agent: str, refresh_token: str):
-        token = Token(user_id=user_id, user_agent=user_agent, refresh_token=refresh_token)
+        token = Token(user_id=user_id, user_agent=user_agent, refresh_token_hash=token_digest(refresh_token))
         self._db.add(token)
-        await self._db.commit()
 
     async def user_update(self, user_found, user_info: dict):
         user_found.social_network_login = user_info['login']
         user_found.first_name = user_info['first_name']
         user_found.last_name = user_info['last_name']
         user_found.is_verified_email = True
-        await self.db_add_user(user_found)
+        after_commit(self._db, partial(self._cache.invalidate, user_found.id))
 
     async def social_network_for_db(self, user_id):
         data = SocialNetworkCreate(
@@ -176,8 +173,6 @@ class YandexAuthServiceCallback(AbstractService):
         )
         social_network = SocialNetwork(**jsonable_encoder(data))
         self._db.add(social_network)
-        await self._db.commit()
-        await self._db.refresh(social_network)
 
 @lru_cache()
 def get_yandex_login_service() -> YandexAuthServiceLogin:
@@ -187,6 +182,8 @@ def get_yandex_login_service() -> YandexAuthServiceLogin:
 @lru_cache()
 def get_yandex_callback_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends()
+        authorize: AuthJWT = Depends(),
+        history_writer: LoginHistoryWriter = Depends(get_login_history_writer),
+        cache: ProfileCache = Depends(get_profile_cache),
 ) -> YandexAuthServiceCallback:
-    return YandexAuthServiceCallback(db, authorize)
\ No newline at end of file
+    return YandexAuthServiceCallback(db, authorize, history_writer, cache)
\ No newline at end of file
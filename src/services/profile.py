@@ -1,79 +1,132 @@
+import base64
 import datetime
-from functools import lru_cache
+from functools import lru_cache, partial
+from typing import AsyncIterator
 from http import HTTPStatus
 
-from async_fastapi_jwt_auth import AuthJWT
+import orjson
 from fastapi import Depends, HTTPException
 from redis.asyncio import Redis
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from werkzeug.security import generate_password_hash
 
 from db.postgres import get_session
+from db.profile_cache import ProfileCache, get_profile_cache
 from db.redis import get_redis
+from db.revocation import RevocationFilter, get_revocation_filter
+from db.unit_of_work import after_commit
 from models.schemas import User, LoginHistory
 from models.users import UserProfileResult, UserChangePassword, ChangeUserProfile, UserProfileHistory, Paginator
 from services.abstract import AbstractService, PatchAbstractService
 from services.common.access_check_common import AccessCheckCommon
+from services.common.auth_context import AuthContext, get_auth_context
 from utils.validators import validate_password
 
 
 class ProfileInfoService(AbstractService, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis, cache: ProfileCache,
+                 revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
+        self._cache = cache
 
-    async def get_data(self) -> UserProfileResult:
+    async def get_data(self) -> bytes:
+        """Профиль в виде готового JSON: при попадании в кэш Postgres не трогаем."""
         await self.check_access()
-        await self._authorize.jwt_required()
 
-        user_id = await self._authorize.get_jwt_subject()
+        user_id = self._auth.subject
+        profile = await self._cache.get(user_id)
+        if profile is not None:
+            return profile
         user = await self._db.get(User, user_id)
-        return UserProfileResult(**user.__dict__)
+        if not user:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='User not found')
+        return await self._cache.set(user_id, UserProfileResult(**user.__dict__))
 
 
 class ProfileHistoryService(AbstractService, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    export_batch = 1000
+
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis, revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
 
-    async def get_data(self, page, limit) -> Paginator:
+    @staticmethod
+    def encode_cursor(login_history: LoginHistory) -> str:
+        cursor = orjson.dumps([login_history.auth_date, login_history.id])
+        return base64.urlsafe_b64encode(cursor).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+        try:
+            auth_date, history_id = orjson.loads(base64.urlsafe_b64decode(cursor))
+            return datetime.datetime.fromisoformat(auth_date), int(history_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Invalid cursor')
+
+    async def get_data(self, page, limit, cursor: str | None = None) -> Paginator:
         await self.check_access()
-        await self._authorize.jwt_required()
 
-        user_id = await self._authorize.get_jwt_subject()
+        user_id = self._auth.subject
 
-        history = await self._db.execute(
-            select(LoginHistory).offset((page-1)*limit).limit(limit).where(
-                LoginHistory.user_id == user_id
-            )
+        # Порядок (auth_date, id) по убыванию стабилен между партициями и совпадает с индексом
+        query = (
+            select(LoginHistory)
+            .where(LoginHistory.user_id == user_id)
+            .order_by(LoginHistory.auth_date.desc(), LoginHistory.id.desc())
+            .limit(limit + 1)
         )
+        if cursor:
+            # Keyset: следующая страница читается с места по индексу, без OFFSET
+            query = query.where(tuple_(LoginHistory.auth_date, LoginHistory.id) < self.decode_cursor(cursor))
+        elif page > 1:
+            query = query.offset((page - 1) * limit)
+        history = (await self._db.execute(query)).scalars().all()
 
-        history_list = []
-        for login_history in history.fetchall():
-            history_list.append(UserProfileHistory(**login_history[0].__dict__))
+        next_cursor = self.encode_cursor(history[limit - 1]) if len(history) > limit else None
+        history_list = [UserProfileHistory(**login_history.__dict__) for login_history in history[:limit]]
 
-        if not history_list and page > 1:
+        if not history_list and (page > 1 or cursor):
             raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Page not found')
         elif not history_list:
             raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='History not found')
 
-        return Paginator(page=page, limit=limit, results=history_list)
+        return Paginator(page=page, limit=limit, results=history_list, next_cursor=next_cursor)
+
+    async def export(self) -> AsyncIterator[bytes]:
+        # Доступ проверяется до начала ответа: после первого чанка статус уже не поменять
+        await self.check_access()
+        return self.export_rows(self._auth.subject)
+
+    async def export_rows(self, user_id) -> AsyncIterator[bytes]:
+        """NDJSON по всей истории: серверный курсор держит в памяти только export_batch строк."""
+        result = await self._db.stream(
+            select(LoginHistory.user_agent, LoginHistory.user_device_type, LoginHistory.auth_date)
+            .where(LoginHistory.user_id == user_id)
+            .order_by(LoginHistory.auth_date.desc(), LoginHistory.id.desc())
+            .execution_options(yield_per=self.export_batch)
+        )
+        async for rows in result.partitions():
+            yield b''.join(orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
 
 
 class ProfileUpdateInfoService(PatchAbstractService, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis, cache: ProfileCache,
+                 revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
+        self._cache = cache
 
     async def patch(self, user_info: ChangeUserProfile) -> UserProfileResult:
         await self.check_access()
-        await self._authorize.jwt_required()
 
-        user_id = await self._authorize.get_jwt_subject()
+        user_id = self._auth.subject
         user = await self._db.get(User, user_id)
 
         for attr, value in user_info.dict().items():
@@ -82,67 +135,74 @@ class ProfileUpdateInfoService(PatchAbstractService, AccessCheckCommon):
 
         user.modified_at = datetime.datetime.now()
 
-        await self._db.commit()
-        await self._db.refresh(user)
-        return UserProfileResult(**user.__dict__)
+        profile = UserProfileResult(**user.__dict__)
+        after_commit(self._db, partial(self._cache.replace, user_id, profile))
+        return profile
 
 
 class UpdatePasswordService(PatchAbstractService, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis, cache: ProfileCache,
+                 revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
+        self._cache = cache
 
     async def patch(self, passwords: UserChangePassword) -> None:
         await self.check_access()
-        await self._authorize.jwt_required()
 
-        user_id = await self._authorize.get_jwt_subject()
+        user_id = self._auth.subject
         user = await self._db.get(User, user_id)
 
-        if not user.check_password(passwords.password):
+        if not await user.check_password(passwords.password):
             raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Wrong password')
         elif not validate_password(passwords.new_password):
             raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Password too simple')
 
-        user.password = generate_password_hash(passwords.new_password)
+        await user.set_password(passwords.new_password)
         user.modified_at = datetime.datetime.now()
-
-        await self._db.commit()
-        await self._db.refresh(user)
+        after_commit(self._db, partial(self._cache.invalidate, user_id))
 
 
 @lru_cache()
 def get_profile_info_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        cache: ProfileCache = Depends(get_profile_cache),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> ProfileInfoService:
-    return ProfileInfoService(db, authorize, redis_token)
+    return ProfileInfoService(db, auth, redis_token, cache, revocation)
 
 
 @lru_cache()
 def get_profile_history_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> ProfileHistoryService:
-    return ProfileHistoryService(db, authorize, redis_token)
+    return ProfileHistoryService(db, auth, redis_token, revocation)
 
 
 @lru_cache()
 def patch_profile_info_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        cache: ProfileCache = Depends(get_profile_cache),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> ProfileUpdateInfoService:
-    return ProfileUpdateInfoService(db, authorize, redis_token)
+    return ProfileUpdateInfoService(db, auth, redis_token, cache, revocation)
 
 
 @lru_cache()
 def update_password_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        cache: ProfileCache = Depends(get_profile_cache),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> UpdatePasswordService:
-    return UpdatePasswordService(db, authorize, redis_token)
+    return UpdatePasswordService(db, auth, redis_token, cache, revocation)
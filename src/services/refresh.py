@@ -1,45 +1,39 @@
-import time
 from functools import lru_cache
 from http import HTTPStatus
 
 from fastapi import Depends, Request, HTTPException
 from async_fastapi_jwt_auth import AuthJWT
-from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 
 from services.abstract import PostAbstractService
-from models.schemas import User, LoginHistory, Token
+from services.common.permissions import role_claims
+from services.common.auth_context import ACCESS_COOKIE, AuthContext, decode_token, get_refresh_context, issued_at_claims
+from models.schemas import User, Token
 from db.postgres import get_session
-from db.redis import get_redis
+from db.revocation import RevocationFilter, get_revocation_filter
+from utils.hashing import token_digest
 
 
 class RefreshService(PostAbstractService):
-    def __init__(self, authorize: AuthJWT, db: AsyncSession, redis_token: Redis):
+    def __init__(self, authorize: AuthJWT, refresh: AuthContext, db: AsyncSession, revocation: RevocationFilter):
         self._authorize = authorize
+        self._refresh = refresh
         self._db = db
-        self._redis_token = redis_token
-
-    async def find_user_role_id(self, user_id: str):
-        result = await self._db.execute(select(User).where(User.id == user_id))
-        user_row = result.fetchone()
-        if user_row:
-            user = user_row[0]
-            role_id = user.role_id
-        else:
-            raise Exception("Please login again")
-        return role_id
-
-    async def find_user_agents(self, user_id: str):
-        result = await self._db.execute(select(LoginHistory.user_agent).where(LoginHistory.user_id == user_id))
-        history_rows = result.fetchall()
-        user_agents = []
-        if history_rows:
-            for row in history_rows:
-                user_agents.append(row)
-        else:
-            raise "User-Agent not found"
-        return user_agents
+        self._revocation = revocation
+
+    async def find_session_role_id(self, user_id: str, refresh_token: str, user_agent: str | None):
+        # Привязка к устройству проверяется по строке сессии в tokens одним индексным запросом
+        result = await self._db.execute(
+            select(User.role_id)
+            .join(Token, Token.user_id == User.id)
+            .where(Token.user_id == user_id, Token.user_agent == user_agent, Token.refresh_token_hash == token_digest(refresh_token))
+            .limit(1)
+        )
+        session_row = result.first()
+        if session_row is None:
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Please login again")
+        return session_row.role_id
 
     @staticmethod
     async def find_current_user_agent(request: Request):
@@ -49,60 +43,47 @@ class RefreshService(PostAbstractService):
     async def update_refresh_token_in_db(self, refresh_token: str, new_refresh_token: str):
         await self._db.execute(
             update(Token)
-            .where(Token.refresh_token == refresh_token)
-            .values(refresh_token=new_refresh_token)
+            .where(Token.refresh_token_hash == token_digest(refresh_token))
+            .values(refresh_token_hash=token_digest(new_refresh_token))
         )
-        await self._db.commit()
 
     async def post(self, request: Request):
-        await self._authorize.jwt_refresh_token_required()
-
-        access_token = request.cookies.get('access_token_cookie')
-        refresh_token = request.cookies.get('refresh_token_cookie')
-
-        access_jti = await self._authorize.get_jti(access_token)
-        refresh_jti = await self._authorize.get_jti(refresh_token)
-
-        if await self._redis_token.exists(access_jti) or await self._redis_token.exists(refresh_jti):
-            raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail="Access and refresh tokens are invalid")
-        
-        user_id = await self._authorize.get_jwt_subject()
-        role_id = await self.find_user_role_id(user_id)
+        access = await decode_token(self._authorize, request.cookies.get(ACCESS_COOKIE), ACCESS_COOKIE, 'access')
+        refresh_token = self._refresh.token
 
-        user_agents = await self.find_user_agents(user_id)
+        access_jti = access.jti
+        refresh_jti = self._refresh.jti
 
-        user_agents = [row[0] for row in user_agents]
+        user_id = self._refresh.subject
+        if await self._revocation.issued_before_epoch(user_id, self._refresh.iat_ms):
+            raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail="Please login again")
         current_user_agent = await self.find_current_user_agent(request)
-        if current_user_agent in user_agents:
-            access_token_exp = (await self._authorize.get_raw_jwt(access_token))["exp"]
-            refresh_token_exp = (await self._authorize.get_raw_jwt(refresh_token))["exp"]
-            
-            access_token_ttl = access_token_exp - int(time.time())
-            refresh_token_ttl = refresh_token_exp - int(time.time())
-
-            await self._redis_token.set(name=access_jti, value=user_id, ex=access_token_ttl)
-            await self._redis_token.set(name=refresh_jti, value=user_id, ex=refresh_token_ttl)
+        role_id = await self.find_session_role_id(user_id, refresh_token, current_user_agent)
 
-            new_access_token = await self._authorize.create_access_token(subject=user_id,
-                                                                         user_claims={"role_id": role_id})
-            new_refresh_token = await self._authorize.create_refresh_token(subject=user_id)
+        if not await self._revocation.revoke(user_id, (access_jti, access.exp), (refresh_jti, self._refresh.exp)):
+            raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail="Access and refresh tokens are invalid")
 
-            await self._authorize.set_access_cookies(new_access_token)
-            await self._authorize.set_refresh_cookies(new_refresh_token)
+        issued = issued_at_claims()
+        new_access_token = await self._authorize.create_access_token(
+            subject=user_id,
+            user_claims={**await role_claims(self._db, role_id), **issued}
+        )
+        new_refresh_token = await self._authorize.create_refresh_token(subject=user_id, user_claims=issued)
 
-            await self.update_refresh_token_in_db(refresh_token=refresh_token, new_refresh_token=new_refresh_token)
+        await self._authorize.set_access_cookies(new_access_token)
+        await self._authorize.set_refresh_cookies(new_refresh_token)
 
-            if not new_access_token and not new_refresh_token:
-                raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Error during refresh tokens')
+        await self.update_refresh_token_in_db(refresh_token=refresh_token, new_refresh_token=new_refresh_token)
 
-        else:
-            raise Exception("Please login again")
+        if not new_access_token and not new_refresh_token:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='Error during refresh tokens')
 
 
 @lru_cache()
 def get_refresh_service(
         authorize: AuthJWT = Depends(),
+        refresh: AuthContext = Depends(get_refresh_context),
         db: AsyncSession = Depends(get_session),
-        redis_token: Redis = Depends(get_redis),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> RefreshService:
-    return RefreshService(authorize, db, redis_token)
+    return RefreshService(authorize, refresh, db, revocation)
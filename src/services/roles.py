@@ -1,8 +1,7 @@
 import datetime
-from functools import lru_cache
+from functools import lru_cache, partial
 from http import HTTPStatus
 
-from async_fastapi_jwt_auth import AuthJWT
 from redis.asyncio import Redis
 from fastapi import Depends, HTTPException
 from sqlalchemy.exc import IntegrityError
@@ -12,17 +11,22 @@ from starlette.requests import Request
 
 from db.postgres import get_session
 from db.redis import get_redis
+from db.revocation import RevocationFilter, get_revocation_filter
+from db.role_registry import RoleRegistry, get_role_registry
+from db.unit_of_work import after_commit
 from models.schemas import Role
 from models.roles import CreateRole, RoleChangePermission, RoleToRepresentation
 from services.abstract import AbstractService, PatchAbstractService, CreateAbstractService, DeleteAbstractService
 from services.common.roles_common import RolesCommon
 from services.common.access_check_common import AccessCheckCommon
+from services.common.auth_context import AuthContext, get_auth_context
 
 
 class RoleGetService(AbstractService, RolesCommon, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis, revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
 
     async def get_data(self, request: Request) -> list[RoleToRepresentation]:
@@ -35,10 +39,13 @@ class RoleGetService(AbstractService, RolesCommon, AccessCheckCommon):
 
 
 class RoleCreateService(CreateAbstractService, RolesCommon, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis,
+                 roles: RoleRegistry, revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
+        self._roles = roles
 
     async def create(self, role: CreateRole, request: Request) -> RoleToRepresentation:
         await self.check_access()
@@ -47,19 +54,23 @@ class RoleCreateService(CreateAbstractService, RolesCommon, AccessCheckCommon):
         new_role = Role(**role.dict())
         self._db.add(new_role)
         try:
-            await self._db.commit()
+            # flush нужен ради id новой роли и ошибки уникальности имени
+            await self._db.flush()
         except IntegrityError:
             raise HTTPException(status_code=HTTPStatus.BAD_REQUEST,
                                 detail="Role with name '%s' already exists" % new_role.name)
-        await self._db.refresh(new_role)
+        after_commit(self._db, self._roles.invalidate)
         return RoleToRepresentation(**new_role.__dict__)
 
 
 class RoleDeleteService(DeleteAbstractService, RolesCommon, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis,
+                 roles: RoleRegistry, revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
+        self._roles = roles
 
     async def delete(self, role_id: int, request: Request) -> None:
         await self.check_access()
@@ -71,14 +82,17 @@ class RoleDeleteService(DeleteAbstractService, RolesCommon, AccessCheckCommon):
             raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Role not found")
 
         await self._db.delete(role)
-        await self._db.commit()
+        after_commit(self._db, partial(self._roles.invalidate, role_id))
 
 
 class RoleUpdateService(PatchAbstractService, RolesCommon, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis,
+                 roles: RoleRegistry, revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
+        self._roles = roles
 
     async def patch(self, role_id: int, role_update: RoleChangePermission, request: Request) -> RoleToRepresentation:
         await self.check_access()
@@ -93,42 +107,48 @@ class RoleUpdateService(PatchAbstractService, RolesCommon, AccessCheckCommon):
 
         role.modified_at = datetime.datetime.now()
 
-        await self._db.commit()
-        await self._db.refresh(role)
+        after_commit(self._db, partial(self._roles.invalidate, role_id))
         return RoleToRepresentation(**role.__dict__)
 
 
 @lru_cache()
 def get_role_create_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        roles: RoleRegistry = Depends(get_role_registry),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> RoleCreateService:
-    return RoleCreateService(db, authorize, redis_token)
+    return RoleCreateService(db, auth, redis_token, roles, revocation)
 
 
 @lru_cache()
 def get_role_get_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> RoleGetService:
-    return RoleGetService(db, authorize, redis_token)
+    return RoleGetService(db, auth, redis_token, revocation)
 
 
 @lru_cache()
 def get_role_delete_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        roles: RoleRegistry = Depends(get_role_registry),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> RoleDeleteService:
-    return RoleDeleteService(db, authorize, redis_token)
+    return RoleDeleteService(db, auth, redis_token, roles, revocation)
 
 
 @lru_cache()
 def get_role_update_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        roles: RoleRegistry = Depends(get_role_registry),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> RoleUpdateService:
-    return RoleUpdateService(db, authorize, redis_token)
+    return RoleUpdateService(db, auth, redis_token, roles, revocation)
@@ -0,0 +1,57 @@
+import time
+from datetime import datetime
+from functools import lru_cache, partial
+from http import HTTPStatus
+from uuid import UUID
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+
+from db.postgres import get_session
+from db.revocation import RevocationFilter, get_revocation_filter
+from db.unit_of_work import after_commit
+from models.schemas import Token, User
+from services.abstract import DeleteAbstractService
+from services.common.access_check_common import AccessCheckCommon
+from services.common.auth_context import AuthContext, get_auth_context
+from services.common.permissions import SESSION_MANAGEMENT
+from services.common.roles_common import RolesCommon
+
+
+async def revoke_all_sessions(db: AsyncSession, revocation: RevocationFilter, user_id: UUID | str) -> bool:
+    """Выход со всех устройств: одна эпоха вместо отзыва каждого jti."""
+    epoch_ms = time.time_ns() // 1_000_000
+    result = await db.execute(
+        update(User).where(User.id == user_id).values(tokens_valid_after=datetime.utcfromtimestamp(epoch_ms / 1000))
+    )
+    if not result.rowcount:
+        return False
+    await db.execute(delete(Token).where(Token.user_id == user_id))
+    # Эпоху публикуем только после коммита: иначе откат оставил бы пользователя разлогиненным без записи в базе
+    after_commit(db, partial(revocation.revoke_user, str(user_id), epoch_ms))
+    return True
+
+
+class RevokeSessionsService(DeleteAbstractService, RolesCommon, AccessCheckCommon):
+    def __init__(self, db: AsyncSession, auth: AuthContext, revocation: RevocationFilter):
+        self._db = db
+        self._auth = auth
+        self._revocation = revocation
+
+    async def delete(self, request: Request, user_id: UUID):
+        await self.check_access()
+        await self.check_auth(SESSION_MANAGEMENT)
+
+        if not await revoke_all_sessions(self._db, self._revocation, user_id):
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="User not found")
+
+
+@lru_cache()
+def get_revoke_sessions_service(
+        db: AsyncSession = Depends(get_session),
+        auth: AuthContext = Depends(get_auth_context),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
+) -> RevokeSessionsService:
+    return RevokeSessionsService(db, auth, revocation)
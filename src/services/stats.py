@@ -0,0 +1,74 @@
+import datetime
+from functools import lru_cache
+from http import HTTPStatus
+from uuid import UUID
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.postgres import get_session
+from db.revocation import RevocationFilter, get_revocation_filter
+from models.schemas import LoginStat, User
+from models.users import LoginStatsDay, UserLoginStats
+from services.abstract import AbstractService
+from services.common.access_check_common import AccessCheckCommon
+from services.common.auth_context import AuthContext, get_auth_context
+from services.common.roles_common import RolesCommon
+
+
+class LoginStatsService(AbstractService, RolesCommon, AccessCheckCommon):
+    """Статистика входов из счётчиков login_stats, без сканирования истории."""
+
+    def __init__(self, db: AsyncSession, auth: AuthContext, revocation: RevocationFilter):
+        self._db = db
+        self._auth = auth
+        self._revocation = revocation
+
+    @staticmethod
+    def since(days: int) -> datetime.date:
+        return datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)
+
+    async def get_data(self, days: int) -> UserLoginStats:
+        await self.check_access()
+        return await self.user_stats(self._auth.subject, days)
+
+    async def get_user_data(self, user_id: UUID, days: int) -> UserLoginStats:
+        await self.check_access()
+        await self.check_auth()
+
+        stats = await self.user_stats(user_id, days)
+        if stats.last_login_at is None and not stats.days and not await self._db.get(User, user_id):
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="User not found")
+        return stats
+
+    async def get_totals(self, days: int) -> list[LoginStatsDay]:
+        await self.check_access()
+        await self.check_auth()
+
+        totals = await self._db.execute(
+            select(LoginStat.day, LoginStat.user_device_type, func.sum(LoginStat.count).label('count'))
+            .where(LoginStat.day >= self.since(days))
+            .group_by(LoginStat.day, LoginStat.user_device_type)
+            .order_by(LoginStat.day.desc(), LoginStat.user_device_type)
+        )
+        return [LoginStatsDay(**row._asdict()) for row in totals]
+
+    async def user_stats(self, user_id, days: int) -> UserLoginStats:
+        last_login_at = await self._db.scalar(select(User.last_login_at).where(User.id == user_id))
+        rows = await self._db.execute(
+            select(LoginStat.day, LoginStat.user_device_type, LoginStat.count)
+            .where(LoginStat.user_id == user_id, LoginStat.day >= self.since(days))
+            .order_by(LoginStat.day.desc(), LoginStat.user_device_type)
+        )
+        return UserLoginStats(last_login_at=last_login_at,
+                              days=[LoginStatsDay(**row._asdict()) for row in rows])
+
+
+@lru_cache()
+def get_login_stats_service(
+        db: AsyncSession = Depends(get_session),
+        auth: AuthContext = Depends(get_auth_context),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
+) -> LoginStatsService:
+    return LoginStatsService(db, auth, revocation)
@@ -1,28 +1,37 @@
 import datetime
-from functools import lru_cache
+from functools import lru_cache, partial
 from http import HTTPStatus
 
-from async_fastapi_jwt_auth import AuthJWT
 from redis.asyncio import Redis
 from fastapi import Depends, HTTPException
+from sqlalchemy import any_, bindparam, select
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
+from core.config import settings
 from db.postgres import get_session
+from db.profile_cache import ProfileCache, get_profile_cache
 from db.redis import get_redis
-from models.roles import RoleAssign, UserRole, RoleInDB
+from db.revocation import RevocationFilter, get_revocation_filter
+from db.unit_of_work import after_commit
+from models.roles import RoleAssign, UserRole, RoleInDB, UserRolesMap
 from models.schemas import Role, User
 from models.users import UserProfileResult
 from services.abstract import PostAbstractService, AbstractService
 from services.common.roles_common import RolesCommon
 from services.common.access_check_common import AccessCheckCommon
+from services.common.auth_context import AuthContext, get_auth_context
 
 
 class UpdateUserRoleService(PostAbstractService, RolesCommon, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis, cache: ProfileCache,
+                 revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
+        self._cache = cache
 
     async def post(self, request: Request, role_assign: RoleAssign) -> UserRole:
         await self.check_access()
@@ -38,43 +47,77 @@ class UpdateUserRoleService(PostAbstractService, RolesCommon, AccessCheckCommon)
         user.role_id = role_assign.role_id
         user.modified_at = datetime.datetime.now()
 
-        await self._db.commit()
-        await self._db.refresh(user)
+        profile = UserProfileResult(**user.__dict__)
+        after_commit(self._db, partial(self._cache.replace, user.id, profile))
 
-        return UserRole(user=UserProfileResult(**user.__dict__), role=RoleInDB(**role.__dict__))
+        return UserRole(user=profile, role=RoleInDB(**role.__dict__))
 
 
 class GetUserRoleService(AbstractService, RolesCommon, AccessCheckCommon):
-    def __init__(self, db: AsyncSession, authorize: AuthJWT, redis_token: Redis):
+    # Пользователь и его роль одним запросом; роль может отсутствовать
+    user_roles = (
+        select(User.id, Role.id.label('role_id'), Role.name, Role.is_subscriber, Role.is_superuser,
+               Role.is_manager, Role.is_admin)
+        .outerjoin(Role, Role.id == User.role_id)
+    )
+
+    def __init__(self, db: AsyncSession, auth: AuthContext, redis_token: Redis, revocation: RevocationFilter):
         self._db = db
-        self._authorize = authorize
+        self._auth = auth
+        self._revocation = revocation
         self._redis_token = redis_token
 
     async def get_data(self, request: Request, user_id) -> RoleInDB:
         await self.check_access()
 
-        user = await self._db.get(User, user_id)
-        if not user:
+        row = (await self._db.execute(self.user_roles.where(User.id == user_id))).first()
+        if not row:
             raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="User not found")
+        if row.role_id is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail="Role not found")
+
+        return self.role_from_row(row)
+
+    async def get_many(self, request: Request, user_ids: list) -> UserRolesMap:
+        await self.check_access()
+
+        if len(user_ids) > settings.user_role.bulk_limit:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST,
+                                detail=f"No more than {settings.user_role.bulk_limit} users per request")
+
+        # Массив одним параметром: текст запроса не зависит от числа id и кэшируется asyncpg
+        ids = bindparam('user_ids', list(set(user_ids)), type_=ARRAY(UUID(as_uuid=True)))
+        rows = await self._db.execute(self.user_roles.where(User.id == any_(ids)))
 
-        role = await self._db.get(Role, user.role_id)
+        result = UserRolesMap(users={}, roles={})
+        for row in rows:
+            result.users[row.id] = row.role_id
+            if row.role_id is not None and row.role_id not in result.roles:
+                result.roles[row.role_id] = self.role_from_row(row)
+        return result
 
-        return RoleInDB(**role.__dict__)
+    @staticmethod
+    def role_from_row(row) -> RoleInDB:
+        return RoleInDB(id=row.role_id, name=row.name, is_subscriber=row.is_subscriber,
+                        is_superuser=row.is_superuser, is_manager=row.is_manager, is_admin=row.is_admin)
 
 
 @lru_cache()
 def update_user_role_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        cache: ProfileCache = Depends(get_profile_cache),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> UpdateUserRoleService:
-    return UpdateUserRoleService(db, authorize, redis_token)
+    return UpdateUserRoleService(db, auth, redis_token, cache, revocation)
 
 
 @lru_cache()
 def get_user_role_service(
         db: AsyncSession = Depends(get_session),
-        authorize: AuthJWT = Depends(),
+        auth: AuthContext = Depends(get_auth_context),
         redis_token: Redis = Depends(get_redis),
+        revocation: RevocationFilter = Depends(get_revocation_filter),
 ) -> GetUserRoleService:
-    return GetUserRoleService(db, authorize, redis_token)
+    return GetUserRoleService(db, auth, redis_token, revocation)
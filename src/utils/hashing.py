@@ -0,0 +1,54 @@
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+from fastapi import HTTPException
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasher:
+    """Считает хэши паролей в пуле процессов, чтобы не блокировать event loop.
+
+    Очередь ограничена: если в работе уже workers + queue_size задач,
+    новый запрос сразу получает 503, а не копится в памяти воркера.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self._executor = ProcessPoolExecutor(max_workers=workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        self._capacity = workers + queue_size
+        self._pending = 0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(generate_password_hash, password)
+
+    async def verify(self, password_hash: str, password: str) -> bool:
+        return bool(await self._run(check_password_hash, password_hash, password))
+
+    async def _run(self, func, *args):
+        if self._pending >= self._capacity:
+            raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+                                detail='Password hashing queue is full, try again later',
+                                headers={'Retry-After': '1'})
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._pending -= 1
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+password_hasher: PasswordHasher | None = None
+
+
+async def get_password_hasher() -> PasswordHasher:
+    return password_hasher
+
+
+def token_digest(token: str) -> bytes:
+    # В базе хранится sha256 refresh-токена: 32 байта вместо JWT целиком
+    return hashlib.sha256(token.encode()).digest()
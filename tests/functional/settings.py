@@ -34,10 +34,20 @@ class TestFastAPISettings(BaseSettings):
         return f'http://{self.host}:{self.port}/api/v1'
 
 
+class TestAppSettings(BaseSettings):
+    """Сервис напрямую, мимо nginx: nginx сам проставляет X-Request-Id."""
+    host: str = Field(validation_alias='APP_HOST', default='auth_service')
+    port: int = Field(validation_alias='APP_PORT', default=8002)
+
+    def url(self):
+        return f'http://{self.host}:{self.port}/api/v1'
+
+
 class TestSettings(BaseSettings):
     redis: TestRedisSettings = TestRedisSettings()
     postgres: TestPostgresSettings = TestPostgresSettings()
     fastapi: TestFastAPISettings = TestFastAPISettings()
+    app: TestAppSettings = TestAppSettings()
 
 
 settings = TestSettings()
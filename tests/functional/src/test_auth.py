@@ -1,4 +1,5 @@
 import pytest
+from sqlalchemy import text
 from starlette import status
 
 from functional.settings import settings
@@ -27,6 +28,38 @@ async def test_user_sign_up(aiohttp_client, admin, login, password, expected_sta
     assert response_status == expected_status
 
 
+@pytest.mark.asyncio
+async def test_user_sign_up_then_login(aiohttp_client, async_session):
+    user_data = {
+        'username': 'testname_signup_login',
+        'login': 'testlogin_signup_login',
+        'password': 'testpassword1!S',
+        'email': 'signup_login@example.ru',
+        'first_name': 'string',
+        'last_name': 'string',
+        'birth_day': '2024-02-29',
+        'picture': 'string',
+    }
+    try:
+        async with aiohttp_client.post(f'{settings.fastapi.url()}/signup/', json=user_data) as response:
+            assert response.status == status.HTTP_201_CREATED
+
+        # Пользователь, созданный через flush, должен быть закоммичен маршрутом
+        login_data = {'login': user_data['login'], 'password': user_data['password']}
+        async with aiohttp_client.post(f'{settings.fastapi.url()}/login/', json=login_data) as response:
+            assert response.status == status.HTTP_201_CREATED
+            assert await response.json() == {"message": "Login success"}
+    finally:
+        async with async_session() as session:
+            async with session.begin():
+                for table in ('login_stats', 'login_histories', 'tokens'):
+                    await session.execute(
+                        text(f'DELETE FROM {table} WHERE user_id IN (SELECT id FROM users WHERE login = :login)'),
+                        {'login': user_data['login']}
+                    )
+                await session.execute(text('DELETE FROM users WHERE login = :login'), {'login': user_data['login']})
+
+
 @pytest.mark.parametrize('admin, login, password, expected_status, expected_body', [
     (True, 'testlogin', 'testpassword1!S', status.HTTP_201_CREATED, {"message": "Login success"}),
     (True, 'testlogin', 't', status.HTTP_400_BAD_REQUEST, {"detail": "Password error"}),
@@ -106,3 +139,147 @@ async def test_user_refresh(aiohttp_client, create_user, admin, login, password,
 
     assert response_status == expected_status
     assert body == expected_body
+
+
+@pytest.mark.parametrize(('admin', 'login', 'password', 'expected_status'), [
+    (True, 'testlogin', 'testpassword1!S', status.HTTP_401_UNAUTHORIZED),
+])
+@pytest.mark.asyncio
+async def test_user_full_logout(aiohttp_client, create_user, admin, login, password, expected_status):
+    user_data = {
+        'login': login,
+        'password': password
+    }
+
+    url = f'{settings.fastapi.url()}/login/'
+    headers = {}
+    sessions = []
+    for _ in range(2):
+        async with aiohttp_client.post(url, json=user_data, headers=headers) as response:
+            sessions.append({'access_token_cookie': response.cookies['access_token_cookie'].value,
+                             'refresh_token_cookie': response.cookies['refresh_token_cookie'].value})
+
+    url = f'{settings.fastapi.url()}/logout/?full_logout=true'
+    async with aiohttp_client.delete(url, cookies=sessions[0], headers=headers) as response:
+        assert response.status == status.HTTP_200_OK
+
+    url = f'{settings.fastapi.url()}/refresh/'
+    async with aiohttp_client.post(url, cookies=sessions[1], headers=headers) as response:
+        response_status = response.status
+
+    assert response_status == expected_status
+
+
+@pytest.mark.parametrize(('admin', 'login', 'password', 'expected_status'), [
+    (True, 'testlogin', 'testpassword1!S', status.HTTP_401_UNAUTHORIZED),
+])
+@pytest.mark.asyncio
+async def test_user_logout_after_full_logout_elsewhere(aiohttp_client, create_user, admin, login, password,
+                                                      expected_status):
+    user_data = {
+        'login': login,
+        'password': password
+    }
+
+    url = f'{settings.fastapi.url()}/login/'
+    sessions = []
+    for user_agent in ('Mozilla/5.0 (Windows NT 10.0)', 'Mozilla/5.0 (Linux; Android 14) Mobile'):
+        async with aiohttp_client.post(url, json=user_data, headers={'User-Agent': user_agent}) as response:
+            sessions.append({'access_token_cookie': response.cookies['access_token_cookie'].value,
+                             'refresh_token_cookie': response.cookies['refresh_token_cookie'].value})
+
+    url = f'{settings.fastapi.url()}/logout/?full_logout=true'
+    async with aiohttp_client.delete(url, cookies=sessions[0]) as response:
+        assert response.status == status.HTTP_200_OK
+
+    # Сессия второго устройства уже закрыта full logout, её выход не должен падать с 500
+    url = f'{settings.fastapi.url()}/logout/'
+    async with aiohttp_client.delete(url, cookies=sessions[1]) as response:
+        response_status = response.status
+
+    assert response_status == expected_status
+
+
+@pytest.mark.parametrize(('admin', 'login', 'password', 'expected_status'), [
+    (True, 'testlogin', 'testpassword1!S', status.HTTP_200_OK),
+])
+@pytest.mark.asyncio
+async def test_user_login_right_after_full_logout(aiohttp_client, create_user, admin, login, password,
+                                                  expected_status):
+    user_data = {
+        'login': login,
+        'password': password
+    }
+
+    url = f'{settings.fastapi.url()}/login/'
+    async with aiohttp_client.post(url, json=user_data) as response:
+        cookies = {'access_token_cookie': response.cookies['access_token_cookie'].value}
+
+    url = f'{settings.fastapi.url()}/logout/?full_logout=true'
+    async with aiohttp_client.delete(url, cookies=cookies) as response:
+        assert response.status == status.HTTP_200_OK
+
+    # Новый вход в ту же секунду, что и full logout, не должен попадать под эпоху отзыва
+    url = f'{settings.fastapi.url()}/login/'
+    async with aiohttp_client.post(url, json=user_data) as response:
+        cookies = {'access_token_cookie': response.cookies['access_token_cookie'].value,
+                   'refresh_token_cookie': response.cookies['refresh_token_cookie'].value}
+
+    async with aiohttp_client.get(f'{settings.fastapi.url()}/profile/', cookies=cookies) as response:
+        response_status = response.status
+
+    assert response_status == expected_status
+
+
+@pytest.mark.parametrize(('admin', 'login', 'password', 'expected_status'), [
+    (False, 'testlogin', 'testpassword1!S', status.HTTP_204_NO_CONTENT),
+])
+@pytest.mark.asyncio
+async def test_permission_check(aiohttp_client, create_user, admin, login, password, expected_status):
+    url = f'{settings.fastapi.url()}/login/'
+    async with aiohttp_client.post(url, json={'login': login, 'password': password}) as response:
+        access_token = response.cookies['access_token_cookie'].value
+
+    url = f'{settings.fastapi.url()}/check/'
+    async with aiohttp_client.get(url, cookies={'access_token_cookie': ''}) as response:
+        assert response.status == status.HTTP_204_NO_CONTENT
+        assert 'X-User-Id' not in response.headers
+
+    headers = {'Authorization': f'Bearer {access_token}'}
+    async with aiohttp_client.get(url, headers=headers) as response:
+        response_status = response.status
+        assert response.headers['X-User-Id']
+
+    async with aiohttp_client.get(f'{url}?permissions=admin', headers=headers) as response:
+        assert response.status == status.HTTP_403_FORBIDDEN
+
+    assert response_status == expected_status
+
+
+@pytest.mark.asyncio
+async def test_request_without_request_id(aiohttp_client, async_session):
+    user_data = {
+        'username': 'testname_no_request_id',
+        'login': 'testlogin_no_request_id',
+        'password': 'testpassword1!S',
+        'email': 'no_request_id@example.ru',
+        'first_name': 'string',
+        'last_name': 'string',
+        'birth_day': '2024-02-29',
+        'picture': 'string',
+    }
+    try:
+        # Запрос идёт мимо nginx, иначе X-Request-Id проставит он
+        async with aiohttp_client.post(f'{settings.app.url()}/signup/', json=user_data) as response:
+            assert response.status == status.HTTP_400_BAD_REQUEST
+            assert await response.json() == {'detail': 'X-Request-Id is required'}
+
+        # Обработчик не запускался: пользователь не создан
+        async with async_session() as session:
+            result = await session.execute(text('SELECT count(*) FROM users WHERE login = :login'),
+                                           {'login': user_data['login']})
+            assert result.scalar() == 0
+    finally:
+        async with async_session() as session:
+            async with session.begin():
+                await session.execute(text('DELETE FROM users WHERE login = :login'), {'login': user_data['login']})
@@ -115,6 +115,27 @@ async def test_get_user_role(async_session, make_get_request, login_user, create
         assert 'id' in response['body']
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize('admin, login, password, expected_status', [
+    (True, 'testloginTrue', 'testpassword1!S', status.HTTP_200_OK),
+])
+async def test_get_user_roles_bulk(async_session, make_post_request, login_user, create_user,
+                                   admin, login, password, expected_status):
+    tokens = await login_user(login, password)
+    access_token = tokens['access_token_cookie'].value
+    async with async_session() as session:
+        async with session.begin():
+            user_id = await session.execute(text("SELECT id FROM users WHERE login = :login"), {"login": login})
+            user_id = str(user_id.scalar())
+    unknown_id = '00000000-0000-0000-0000-000000000000'
+
+    response = await make_post_request({'user_ids': [user_id, unknown_id]}, 'user_role/bulk/', access_token)
+    assert response['status'] == expected_status
+    assert list(response['body']['users']) == [user_id]
+    role_id = response['body']['users'][user_id]
+    assert response['body']['roles'][str(role_id)]['id'] == role_id
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize('admin, login, password, expected_status', [
     (True, 'testloginTrue', 'testpassword1!S', status.HTTP_201_CREATED),
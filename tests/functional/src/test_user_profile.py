@@ -1,3 +1,6 @@
+import asyncio
+import json
+
 import pytest
 from starlette import status
 
@@ -98,11 +101,16 @@ async def test_user_history(aiohttp_client, create_user, login_user, admin, logi
     cookies = {'access_token_cookie': tokens['access_token_cookie'].value}
 
     url = f'{settings.fastapi.url()}/profile/history?page=1&limit=10'
-    async with aiohttp_client.get(url, cookies=cookies) as response:
-        body = None
-        response_status = response.status
-        if 'Content-Type' in response.headers and 'application/json' in response.headers['Content-Type']:
-            body = await response.json()
+    # История входов пишется в базу в фоне, поэтому даём ей время долететь
+    for _ in range(10):
+        async with aiohttp_client.get(url, cookies=cookies) as response:
+            body = None
+            response_status = response.status
+            if 'Content-Type' in response.headers and 'application/json' in response.headers['Content-Type']:
+                body = await response.json()
+        if response_status != status.HTTP_404_NOT_FOUND:
+            break
+        await asyncio.sleep(0.5)
 
     assert response_status == expected_status
     assert 'page' in body
@@ -110,3 +118,62 @@ async def test_user_history(aiohttp_client, create_user, login_user, admin, logi
     assert 'results' in body
     assert body['page'] == 1
     assert body['limit'] == 10
+
+
+@pytest.mark.parametrize('admin, login, password, expected_status', [
+    (False, 'testloginFalse', 'testpassword1!S', status.HTTP_200_OK),
+])
+@pytest.mark.asyncio
+async def test_user_login_stats(aiohttp_client, create_user, login_user, admin, login, password, expected_status):
+    tokens = await login_user(login, password)
+    cookies = {'access_token_cookie': tokens['access_token_cookie'].value}
+
+    url = f'{settings.fastapi.url()}/profile/stats?days=1'
+    # Счётчики обновляются вместе с историей входов, тоже в фоне
+    for _ in range(10):
+        async with aiohttp_client.get(url, cookies=cookies) as response:
+            response_status = response.status
+            body = await response.json()
+        if body.get('days'):
+            break
+        await asyncio.sleep(0.5)
+
+    assert response_status == expected_status
+    assert body['last_login_at'] is not None
+    assert sum(day['count'] for day in body['days']) >= 1
+
+
+@pytest.mark.parametrize('admin, login, password', [
+    (False, 'testloginFalse', 'testpassword1!S'),
+])
+@pytest.mark.asyncio
+async def test_user_profile_cache(aiohttp_client, create_user, login_user, redis_client, admin, login, password):
+    tokens = await login_user(login, password)
+    cookies = {'access_token_cookie': tokens['access_token_cookie'].value}
+    url = f'{settings.fastapi.url()}/profile/'
+    key = f'profile:{create_user}'
+    redis_client.delete(key)
+
+    # Промах: профиль читается из Postgres и кладётся в кэш
+    async with aiohttp_client.get(url, cookies=cookies) as response:
+        assert response.status == status.HTTP_200_OK
+        body = await response.json()
+    assert json.loads(redis_client.get(key)) == body
+
+    # Попадание: ответ берётся из Redis, а не из базы
+    redis_client.set(key, json.dumps({**body, 'first_name': 'cached'}))
+    async with aiohttp_client.get(url, cookies=cookies) as response:
+        assert (await response.json())['first_name'] == 'cached'
+
+    # Изменение профиля перезаписывает кэш
+    async with aiohttp_client.patch(url, cookies=cookies, json={'first_name': 'patched'}) as response:
+        assert response.status == status.HTTP_201_CREATED
+    assert json.loads(redis_client.get(key))['first_name'] == 'patched'
+    async with aiohttp_client.get(url, cookies=cookies) as response:
+        assert (await response.json())['first_name'] == 'patched'
+
+    # Смена пароля удаляет профиль из кэша
+    passwords = {'password': password, 'new_password': password}
+    async with aiohttp_client.patch(f'{url}change_password/', cookies=cookies, json=passwords) as response:
+        assert response.status == status.HTTP_201_CREATED
+    assert redis_client.get(key) is None
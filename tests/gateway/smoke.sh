@@ -0,0 +1,47 @@
+#!/bin/sh
+# Сквозная проверка auth_request: nginx -> /api/v1/check/ -> whoami с заголовками X-User-*
+set -eu
+
+URL="${GATEWAY_URL:-http://localhost:83}"
+LOGIN="gateway$(date +%s)"
+PASSWORD='Gatewaypassword1!'
+
+fail() {
+    echo "FAIL: $1" >&2
+    exit 1
+}
+
+until curl -sf -o /dev/null "$URL/api/openapi.json"; do
+    sleep 1
+done
+
+curl -sf -o /dev/null -X POST "$URL/api/v1/signup/" -H 'Content-Type: application/json' \
+    -d "{\"username\": \"$LOGIN\", \"login\": \"$LOGIN\", \"password\": \"$PASSWORD\",
+         \"first_name\": null, \"last_name\": null, \"email\": \"$LOGIN@example.com\",
+         \"birth_day\": null, \"picture\": null}" || fail 'signup'
+TOKEN=$(curl -sf -D - -o /dev/null -X POST "$URL/api/v1/login/" -H 'Content-Type: application/json' \
+    -d "{\"login\": \"$LOGIN\", \"password\": \"$PASSWORD\"}" \
+    | sed -n 's/^[Ss]et-[Cc]ookie: access_token_cookie=\([^;]*\).*/\1/p')
+[ -n "$TOKEN" ] || fail 'login returned no access token'
+
+# Без токена запрос проходит с анонимными правами и без X-User-Id
+BODY=$(curl -sf "$URL/protected/") || fail 'anonymous request rejected'
+echo "$BODY" | grep -qi '^X-User-Permissions: 0' || fail 'anonymous permissions not forwarded'
+echo "$BODY" | grep -qi '^X-User-Id: .\+' && fail 'anonymous request got a user id'
+
+# С токеном upstream видит пользователя; повторная проверка отвечает из кэша nginx
+BODY=$(curl -sf -H "Authorization: Bearer $TOKEN" "$URL/protected/") || fail 'bearer request rejected'
+echo "$BODY" | grep -qi '^X-User-Id: .\+' || fail 'user id not forwarded'
+CACHE=$(curl -sf -D - -o /dev/null -H "Authorization: Bearer $TOKEN" "$URL/protected/" \
+    | sed -n 's/^[Xx]-[Aa]uth-[Cc]ache: \([A-Z]*\).*/\1/p')
+[ "$CACHE" = 'HIT' ] || fail "auth decision was not cached ('$CACHE')"
+
+# Обычный пользователь не проходит в location, требующий admin
+STATUS=$(curl -s -o /dev/null -w '%{http_code}' -H "Authorization: Bearer $TOKEN" "$URL/protected/admin/")
+[ "$STATUS" = '403' ] || fail "admin location returned $STATUS"
+
+# Битый токен отклоняется
+STATUS=$(curl -s -o /dev/null -w '%{http_code}' -H 'Authorization: Bearer broken' "$URL/protected/")
+[ "$STATUS" = '401' ] || fail "broken token returned $STATUS"
+
+echo 'gateway smoke test passed'